@@ -0,0 +1,204 @@
+import argparse
+import concurrent.futures
+import contextlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import resource
+import tempfile
+import time
+import typing
+
+import build
+
+update_content_path = pathlib.Path(__file__).resolve().parents[2] / "update_content.py"
+
+
+def load_update_content():
+    spec = importlib.util.spec_from_file_location("update_content", update_content_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_example_tree(
+    root: pathlib.Path, posts: int, includes: int, lines: int
+) -> typing.List[str]:
+    # Synthetic posts look like ours: a README.md per package including `includes`
+    # example files, each with a code block of `lines` lines (and half of it again).
+    post_names = []
+    for p in range(posts):
+        name = f"post_{p:04d}"
+        package = root / build.examples_dir / name
+        package.mkdir(parents=True)
+        (package / "__init__.py").write_text("")
+        readme = [f"# Post {p}", "", "Some introduction to this synthetic post.", ""]
+        for i in range(includes):
+            example = package / f"example_{i:03d}.py"
+            example.write_text(
+                "\n".join(
+                    f"value_{j} = {j} * {i}  # line {j} of example {i}"
+                    for j in range(lines)
+                )
+            )
+            readme += [
+                f"## Example {i}",
+                "",
+                "```Python",
+                f"{{! ./{build.examples_dir}/{name}/{example.name} !}}",
+                "```",
+                "",
+                "```Python",
+                f"{{! ./{build.examples_dir}/{name}/{example.name} [ln:1-{lines // 2}] !}}",
+                "```",
+                "",
+            ]
+        (package / "README.md").write_text("\n".join(readme))
+        post_names.append(name)
+    return post_names
+
+
+def generate_source_markdown(path: pathlib.Path, sections: int, lines: int) -> None:
+    update_content = load_update_content()
+    headings = list(update_content.name_config) + ["Something unrelated"]
+    with open(path, "w") as source:
+        source.write("# Synthetic CV\n\n")
+        for s in range(sections):
+            source.write(f"## {headings[s % len(headings)]}\n")
+            for j in range(lines):
+                source.write(f"* Line {j} of section {s}, with ### some ## markers\n")
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss is reported in KiB on linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+def run_case(case: str, params: typing.Dict[str, int], workdir: str) -> typing.Dict:
+    # Runs in a fresh process, so the peak RSS belongs to this case only
+    os.chdir(workdir)
+    root = pathlib.Path(workdir)
+    content_dir = root / "content" / "posts"
+    content_dir.mkdir(parents=True)
+    files_written = 0
+    if case == "update_content.write_pages":
+        update_content = load_update_content()
+        generate_source_markdown(root / "cv.md", params["sections"], params["lines"])
+        started = time.perf_counter()
+        # Repeated headings write the same page again, count each page file once
+        page_paths = update_content.write_pages("cv.md", str(content_dir))
+        files_written = len(set(page_paths))
+        wall = time.perf_counter() - started
+    else:
+        posts = generate_example_tree(
+            root, params["posts"], params["includes"], params["lines"]
+        )
+        started = time.perf_counter()
+        post_md_source_map = build.get_md_with_source(content_dir, posts=posts)
+        wall = time.perf_counter() - started
+        if case != "build.get_md_with_source":
+            # Keep the per file log lines out of the timings and the report
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                if case == "build.write_md_with_sources (unchanged)":
+                    build.write_md_with_sources(post_md_source_map)
+                started = time.perf_counter()
+                files_written = build.write_md_with_sources(post_md_source_map).written
+                wall = time.perf_counter() - started
+    return {
+        "case": case,
+        "params": params,
+        "wall_s": round(wall, 6),
+        "peak_rss_kb": peak_rss_kb(),
+        "files_written": files_written,
+    }
+
+
+def run_benchmarks(
+    posts: typing.List[int], includes: int, lines: int, sections: typing.List[int]
+) -> typing.List[typing.Dict]:
+    cases = []
+    for n in posts:
+        params = {"posts": n, "includes": includes, "lines": lines}
+        cases += [
+            ("build.get_md_with_source", params),
+            ("build.write_md_with_sources", params),
+            ("build.write_md_with_sources (unchanged)", params),
+        ]
+    for n in sections:
+        cases.append(("update_content.write_pages", {"sections": n, "lines": lines}))
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case, params in cases:
+        with tempfile.TemporaryDirectory() as workdir:
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_case, case, params, workdir).result()
+        print(
+            f"{result['case']:<42} {json.dumps(result['params']):<48} "
+            f"{result['wall_s']:>10.4f}s {result['peak_rss_kb']:>8d}KiB "
+            f"{result['files_written']:>6d} files"
+        )
+        results.append(result)
+    return results
+
+
+def compare_to_baseline(
+    results: typing.List[typing.Dict],
+    baseline: typing.List[typing.Dict],
+    tolerance: float,
+) -> typing.List[str]:
+    baseline_by_case = {(r["case"], json.dumps(r["params"])): r for r in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_by_case.get((result["case"], json.dumps(result["params"])))
+        if previous is None:
+            continue
+        for metric in ("wall_s", "peak_rss_kb"):
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['case']} {json.dumps(result['params'])}: {metric} "
+                    f"{previous[metric]} -> {result[metric]}"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--posts", type=int, nargs="+", default=[10, 50, 200])
+    arg_parser.add_argument("--includes", type=int, default=4)
+    arg_parser.add_argument("--lines", type=int, default=500)
+    arg_parser.add_argument("--sections", type=int, nargs="+", default=[10, 100, 1000])
+    arg_parser.add_argument(
+        "--output", type=pathlib.Path, help="Write the results as json to this file"
+    )
+    arg_parser.add_argument(
+        "--baseline", type=pathlib.Path, help="Fail if results regress against this file"
+    )
+    arg_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown against the baseline",
+    )
+    args = arg_parser.parse_args()
+
+    bench_results = run_benchmarks(args.posts, args.includes, args.lines, args.sections)
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                {"python": platform.python_version(), "results": bench_results}, indent=2
+            )
+        )
+    if args.baseline:
+        found = compare_to_baseline(
+            bench_results,
+            json.loads(args.baseline.read_text())["results"],
+            args.tolerance,
+        )
+        for regression in found:
+            print("Regression:", regression)
+        if found:
+            raise SystemExit(1)
@@ -1,40 +1,482 @@
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
 import pathlib
+import subprocess
+import tempfile
+import time
+import urllib.parse
 import markdown
 import typing
 
 
 examples_dir = pathlib.Path("python_examples")
-post_dirs: typing.List[str] = [
-    "albert_pretraining",
-    "pydantic_powers",
-    "github_oath_fastapi",
-    "moto_mocks",
-    "oauth_at_cloudfront",
-    "sign_cf_cookies",
-    "end_to_end_sound_classification",
-    "teacher_forcing_scheduled_sampler",
-]
+manifest_path = pathlib.Path(".build_manifest.json")
+discovery_cache_path = pathlib.Path(".post_dirs_cache.json")
+
+# Manifest layout: {post: {"target": "<content path>", "inputs": {"<path or url>": sha256}}}
+# Remote includes are stored with a hash of None and always mark a post as changed.
+Manifest = typing.Dict[str, typing.Dict[str, typing.Any]]
+
+
+def hash_file(path: pathlib.Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_manifest(path: pathlib.Path = manifest_path) -> Manifest:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError:
+        # A broken manifest only costs a full rebuild
+        return {}
+
+
+def save_manifest(manifest: Manifest, path: pathlib.Path = manifest_path) -> None:
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def is_unchanged(target: pathlib.Path, entry: typing.Optional[typing.Dict]) -> bool:
+    if not entry or entry.get("target") != str(target) or not target.exists():
+        return False
+    for source, digest in entry["inputs"].items():
+        source_path = pathlib.Path(source)
+        if digest is None or not source_path.exists():
+            return False
+        if hash_file(source_path) != digest:
+            return False
+    return True
+
+
+def discover_post_dirs(
+    examples: pathlib.Path = examples_dir, cache_path: pathlib.Path = discovery_cache_path
+) -> typing.List[str]:
+    # Every package in `examples` with a README.md is a post. Adding or removing a
+    # package or README.md changes the mtime of its parent, so the mtimes key the cache.
+    mtimes = {str(examples): examples.stat().st_mtime_ns}
+    mtimes.update(
+        {
+            str(d): d.stat().st_mtime_ns
+            for d in examples.iterdir()
+            if d.is_dir() and not d.name.startswith(("_", "."))
+        }
+    )
+    if cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text())
+            if cache["mtimes"] == mtimes:
+                return cache["posts"]
+        except (json.JSONDecodeError, KeyError):
+            pass
+    posts = sorted(
+        d.name
+        for d in examples.iterdir()
+        if (d / "__init__.py").is_file() and (d / "README.md").is_file()
+    )
+    cache_path.write_text(json.dumps({"mtimes": mtimes, "posts": posts}, indent=2))
+    return posts
+
+
+def get_changed_posts(
+    ref: str, posts: typing.List[str], manifest: typing.Optional[Manifest] = None
+) -> typing.List[str]:
+    # A post is affected when a file in its own package changed or, if a manifest is
+    # known, when one of the files it includes from another package changed.
+    diff = subprocess.run(
+        ["git", "diff", "--name-only", "--relative", ref, "--"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    changed = set(diff.stdout.split())
+    affected = []
+    for post in posts:
+        inputs = (manifest or {}).get(post, {}).get("inputs", {})
+        if any(path.startswith(f"{examples_dir / post}/") for path in changed) or (
+            changed.intersection(inputs)
+        ):
+            affected.append(post)
+    return affected
+
+
+class IncludeCache:
+    """Include file contents shared by every converter of a build, keyed on path and mtime."""
+
+    def __init__(self):
+        self.entries: typing.Dict[str, typing.Tuple[int, typing.List[str], str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename: str) -> typing.Optional[typing.Tuple[typing.List[str], str]]:
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except OSError:
+            return None
+        entry = self.entries.get(filename)
+        if entry is not None and entry[0] == mtime:
+            self.hits += 1
+            return entry[1], entry[2]
+        self.misses += 1
+        return None
+
+    def read(self, filename: str, encoding: str) -> typing.Tuple[typing.List[str], str]:
+        # The mtime is taken before reading, a save during the read misses next time.
+        # Lines are split like mdx_include does, the digest is of the bytes read.
+        mtime = os.stat(filename).st_mtime_ns
+        data = pathlib.Path(filename).read_bytes()
+        lines = "".join([data.decode(encoding), "\n"]).splitlines()
+        digest = hashlib.sha256(data).hexdigest()
+        self.entries[filename] = (mtime, lines, digest)
+        return lines, digest
+
+
+class IncludeCacheView(dict):
+    """Per converter stand-in for mdx_include's local content cache, holding the lines
+    and digests of the files of one post. `read` replaces mdx_include's own file reads
+    and serves them from the shared cache, `read_remote` records the downloads.
+    """
+
+    def __init__(self, cache: IncludeCache, download: typing.Callable):
+        super().__init__()
+        self.cache = cache
+        self.download = download
+        # Includes that failed to load and remote ones have no digest, so their post is
+        # always rebuilt
+        self.digests: typing.Dict[str, typing.Optional[str]] = {}
+
+    def read(self, filename: str, encoding: str) -> typing.Tuple[typing.List[str], bool]:
+        entry = self.cache.get(filename)
+        if entry is None:
+            try:
+                entry = self.cache.read(filename, encoding)
+            except (OSError, UnicodeDecodeError):
+                # Like mdx_include, a missing include renders empty
+                print(f"Could not read included file: {filename}")
+                self.digests[filename] = None
+                return [], False
+        self[filename], self.digests[filename] = entry
+        return entry[0], True
+
+    def read_remote(
+        self, url: str, encoding: str = "utf-8"
+    ) -> typing.Tuple[typing.List[str], bool]:
+        self.digests[url] = None
+        return self.download(url, encoding)
+
+
+# One cache per process, worker processes of the pool keep theirs across posts
+include_cache = IncludeCache()
+
+
+class ConvertedPost(typing.NamedTuple):
+    md_source: str
+    inputs: typing.Dict[str, typing.Optional[str]]
+    include_hits: int = 0
+    include_misses: int = 0
+
+
+def convert_post(post: str, cache: typing.Optional[IncludeCache] = None) -> ConvertedPost:
+    cache = include_cache if cache is None else cache
+    hits, misses = cache.hits, cache.misses
+    readme = examples_dir / post / "README.md"
+    md = markdown.Markdown(extensions=["mdx_include"])
+    # Only the included lines are shared, mdx_include still slices and recurses per post
+    preprocessor = md.preprocessors["mdx_include"]
+    view = IncludeCacheView(cache, preprocessor.get_remote_content_list)
+    preprocessor.mdx_include_content_cache_local = view
+    preprocessor.get_local_content_list = view.read
+    preprocessor.get_remote_content_list = view.read_remote
+    readme_data = readme.read_bytes()
+    _ = md.convert(readme_data.decode("utf8"))
+    # Inputs are hashed from the bytes converted, a save while converting leaves a
+    # stale digest behind and the post is rebuilt next time
+    inputs: typing.Dict[str, typing.Optional[str]] = {
+        str(readme): hashlib.sha256(readme_data).hexdigest(),
+        **view.digests,
+    }
+    return ConvertedPost(
+        "\n".join(md.lines), inputs, cache.hits - hits, cache.misses - misses  # noqa
+    )
+
+
+class WriteReport(typing.NamedTuple):
+    written: int
+    skipped: int
+
+
+def iter_convert_posts(
+    posts: typing.List[str], jobs: int = 1
+) -> typing.Iterator[typing.Tuple[str, typing.Union[ConvertedPost, Exception]]]:
+    # Outcomes are yielded in the order of `posts`, no matter which worker finishes
+    # first. At most `jobs` posts are in flight, so memory stays bounded by the pool size.
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(posts) < 2:
+        for post in posts:
+            try:
+                outcome = convert_post(post)
+            except Exception as e:
+                outcome = e
+            yield post, outcome
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        in_flight: typing.Deque = collections.deque()
+        for post in posts:
+            in_flight.append((post, pool.submit(convert_post, post)))
+            if len(in_flight) > jobs:
+                done_post, future = in_flight.popleft()
+                yield done_post, future.exception() or future.result()
+        while in_flight:
+            done_post, future = in_flight.popleft()
+            yield done_post, future.exception() or future.result()
+
+
+def iter_md_with_source(
+    content_dir: pathlib.Path,
+    manifest: typing.Optional[Manifest] = None,
+    jobs: int = 1,
+    posts: typing.Optional[typing.List[str]] = None,
+    include_stats: typing.Optional[collections.Counter] = None,
+) -> typing.Iterator[typing.Tuple[pathlib.Path, str]]:
+    # Passing a manifest enables the incremental mode: posts whose inputs have the
+    # same hashes as in the last build are skipped and the manifest is updated in place.
+    # Failed posts don't stop the others, they are reported together at the end.
+    # Include cache hits/misses of all converters are summed into `include_stats`.
+    posts = discover_post_dirs() if posts is None else posts
+    targets = {post: content_dir / f"{post}.md" for post in posts}
+    pending = [
+        post
+        for post in posts
+        if manifest is None or not is_unchanged(targets[post], manifest.get(post))
+    ]
+    failures = []
+    for post, outcome in iter_convert_posts(pending, jobs):
+        if isinstance(outcome, Exception):
+            failures.append(f"{post}: {outcome!r}")
+            continue
+        if include_stats is not None:
+            include_stats.update(hits=outcome.include_hits, misses=outcome.include_misses)
+        if manifest is not None:
+            manifest[post] = {"target": str(targets[post]), "inputs": outcome.inputs}
+        yield targets[post], outcome.md_source
+    if failures:
+        raise RuntimeError("Failed to convert posts:\n" + "\n".join(failures))
 
 
 def get_md_with_source(
-    content_dir: pathlib.Path
+    content_dir: pathlib.Path,
+    manifest: typing.Optional[Manifest] = None,
+    jobs: int = 1,
+    posts: typing.Optional[typing.List[str]] = None,
 ) -> typing.Dict[pathlib.Path, str]:
-    target2source_map = {}
-    for post in post_dirs:
-        md = markdown.Markdown(extensions=["mdx_include"])
-        _ = md.convert((examples_dir / post / "README.md").read_text())
-        target2source_map[(content_dir / f"{post}.md")] = "\n".join(md.lines)  # noqa
-    return target2source_map
+    return dict(iter_md_with_source(content_dir, manifest, jobs, posts))
+
+
+def is_identical(path: pathlib.Path, data: bytes) -> bool:
+    # Compare the cheap size first and only hash the file when sizes match
+    try:
+        if path.stat().st_size != len(data):
+            return False
+    except FileNotFoundError:
+        return False
+    digest = hashlib.sha256()
+    with path.open("rb") as existing:
+        for chunk in iter(lambda: existing.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.digest() == hashlib.sha256(data).digest()
+
+
+def write_atomic(path: pathlib.Path, data: bytes) -> None:
+    # Write next to the target and rename, so hugo never picks up half written posts
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as tmp:
+        tmp.write(data)
+    # Temp files are created with 0600, keep the permissions a plain write would give
+    os.chmod(tmp.name, path.stat().st_mode if path.exists() else 0o644)
+    os.replace(tmp.name, path)
 
 
-def write_md_with_sources(path_source_map: typing.Dict[pathlib.Path, str]) -> None:
-    for path, md_source in path_source_map.items():
+def write_md_with_sources(
+    path_source_map: typing.Union[
+        typing.Dict[pathlib.Path, str], typing.Iterable[typing.Tuple[pathlib.Path, str]]
+    ],
+) -> WriteReport:
+    written, skipped = 0, 0
+    items = (
+        path_source_map.items() if isinstance(path_source_map, dict) else path_source_map
+    )
+    for path, md_source in items:
+        data = md_source.encode("utf8")
+        if is_identical(path, data):
+            skipped += 1
+            continue
         print(f"Writing source to {path}")
-        path.write_text(md_source)
+        write_atomic(path, data)
+        written += 1
+    return WriteReport(written, skipped)
+
+
+def get_dependency_graph(manifest: Manifest) -> typing.Dict[str, typing.Set[str]]:
+    # Maps every local input (README.md or included file) to the posts depending on it.
+    # Includes that are missing stay in the graph, creating them triggers a rebuild.
+    graph: typing.Dict[str, typing.Set[str]] = collections.defaultdict(set)
+    for post, entry in manifest.items():
+        for source in entry["inputs"]:
+            if not urllib.parse.urlparse(source).netloc:
+                graph[source].add(post)
+    return graph
+
+
+def snapshot_mtimes(
+    paths: typing.Iterable[str],
+) -> typing.Dict[str, typing.Optional[int]]:
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def get_watch_graph(
+    manifest: Manifest, posts: typing.List[str]
+) -> typing.Dict[str, typing.Set[str]]:
+    # The README.md of every post is watched, even if it never built and has no entry
+    graph = get_dependency_graph({p: e for p, e in manifest.items() if p in posts})
+    for post in posts:
+        graph[str(examples_dir / post / "README.md")].add(post)
+    return graph
+
+
+def rebuild(
+    content_dir: pathlib.Path, manifest: Manifest, jobs: int, posts: typing.List[str]
+) -> typing.Optional[WriteReport]:
+    # Failed posts are reported and watched further, they don't stop the watch
+    try:
+        return write_md_with_sources(
+            iter_md_with_source(content_dir, manifest, jobs, posts)
+        )
+    except RuntimeError as e:
+        print(e)
+        return None
+    finally:
+        save_manifest(manifest)
+
+
+def watch(
+    content_dir: pathlib.Path,
+    jobs: int = 1,
+    interval: float = 0.2,
+    debounce: float = 0.1,
+    only: typing.Optional[typing.List[str]] = None,
+) -> None:
+    # Polls the mtimes of all known inputs (a stat per file is cheap for the few
+    # hundred files we have and needs no extra dependency). A burst of saves is
+    # collected until nothing changed for `debounce` seconds, then only the posts
+    # depending on the changed files are rebuilt incrementally. With `only` just these
+    # posts are built and watched, otherwise new posts are picked up as they appear.
+    manifest = load_manifest()
+    posts = only or discover_post_dirs()
+    rebuild(content_dir, manifest, jobs, posts)
+    graph = get_watch_graph(manifest, posts)
+    mtimes = snapshot_mtimes(graph)
+    print(f"Watching {len(graph)} files of {len(posts)} posts, stop with Ctrl+C")
+    while True:
+        time.sleep(interval)
+        current = snapshot_mtimes(graph)
+        new_posts = set() if only else set(discover_post_dirs()).difference(posts)
+        if current == mtimes and not new_posts:
+            continue
+        while True:
+            time.sleep(debounce)
+            settled = snapshot_mtimes(graph)
+            if settled == current:
+                break
+            current = settled
+        started = time.monotonic()
+        changed = [path for path, mtime in current.items() if mtimes.get(path) != mtime]
+        posts = only or discover_post_dirs()
+        affected = sorted(new_posts.union(*(graph[path] for path in changed)))
+        report = rebuild(content_dir, manifest, jobs, affected)
+        if report is not None:
+            print(
+                f"Rebuilt {', '.join(affected)} ({report.written} written) "
+                f"in {(time.monotonic() - started) * 1000:.0f}ms"
+            )
+        graph = get_watch_graph(manifest, posts)
+        # The baseline is the snapshot taken before rebuilding, so saves during the
+        # rebuild are seen on the next poll. Inputs new to the graph have no baseline,
+        # their posts are checked once more against the manifest hashes.
+        mtimes = {path: current.get(path) for path in graph}
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rebuild posts whose README.md or included files changed",
+    )
+    arg_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes converting posts (0 uses all cpus)",
+    )
+    arg_parser.add_argument(
+        "--only",
+        action="append",
+        metavar="POST",
+        help="Only build the given post, can be passed multiple times",
+    )
+    arg_parser.add_argument(
+        "--changed-since",
+        metavar="GIT_REF",
+        help="Only build posts affected by changes since the given git ref",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and rebuild posts whose README.md or included files change",
+    )
+    args = arg_parser.parse_args()
+
+    post_dirs = discover_post_dirs()
+    if args.only:
+        unknown = set(args.only).difference(post_dirs)
+        if unknown:
+            arg_parser.error(f"Unknown posts: {', '.join(sorted(unknown))}")
+        post_dirs = [post for post in post_dirs if post in args.only]
+    if args.changed_since and args.watch:
+        arg_parser.error("--changed-since can't be combined with --watch")
+    if args.changed_since:
+        post_dirs = get_changed_posts(args.changed_since, post_dirs, load_manifest())
+
     content_post_dir = pathlib.Path("../../content/posts/")
     content_post_dir.mkdir(parents=True, exist_ok=True)
-    post_md_source_map = get_md_with_source(content_post_dir)
-    write_md_with_sources(post_md_source_map)
+    if args.watch:
+        try:
+            watch(content_post_dir, args.jobs, only=post_dirs if args.only else None)
+        except KeyboardInterrupt:
+            pass
+        raise SystemExit(0)
+    build_manifest = load_manifest() if args.incremental else None
+    include_counts: collections.Counter = collections.Counter()
+    report = write_md_with_sources(
+        iter_md_with_source(
+            content_post_dir, build_manifest, args.jobs, post_dirs, include_counts
+        )
+    )
+    print(f"Wrote {report.written} files, skipped {report.skipped} unchanged files")
+    print(
+        f"Include cache: {include_counts['hits']} hits, {include_counts['misses']} misses"
+    )
+    if build_manifest is not None:
+        save_manifest(build_manifest)
+        print(f"Rebuilt {sum(report)} of {len(post_dirs)} posts")
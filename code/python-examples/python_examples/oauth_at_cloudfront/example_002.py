@@ -0,0 +1,539 @@
+""" Same lambda as in example_001, but keys and verified tokens are cached across warm
+invocations. The module is self-contained (lambda@edge deploys single files) and keeps
+its import cheap: requests is replaced by urllib and jose/hashlib are imported on first
+use, while the JWKS is fetched and prepared once during the lambdas init phase. """
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from jose.exceptions import JWTError, JWSError
+
+if TYPE_CHECKING:
+    from jose.backends.base import Key
+
+
+# Config requires hard coding REGION, USERPOOLID and CLIENTID,
+# since lambda@edge does not support env variables (state Feb.2022)
+REGION = ""
+USERPOOLID = ""
+CLIENTID = ""
+REDIRECTURI = ""
+# Fetch and prepare the JWKS while the container initializes, not in the first request
+PRIME_ON_INIT = True
+
+# Have some default responses
+NOT_AUTHORIZED_401 = {
+    "status": "401",
+    "statusDescription": "Unauthorized",
+    "headers": {
+        "cache-control": [{"key": "Cache-Control", "value": "no-cache"}],
+        "content-type": [{"key": "Content-Type", "value": "text/html"}],
+    },
+    "body": "Sorry, not with this token.",
+}
+REDIRECT_302 = {
+    "status": "302",
+    "statusDescription": "Found",
+    "headers": {"location": [{"key": "Location", "value": REDIRECTURI}]},
+}
+
+# On failure return the following response
+DEFAULT_RESPONE = REDIRECT_302
+
+# List of user_info in access_token to check
+required_user_info = (
+    "sub",
+    "cognito:groups",  # only required when working with groups
+    "token_use",
+    "scope",
+    "auth_time",
+    "iss",
+    "exp",
+    "client_id",
+    "username",
+)
+
+# Cognito rotates keys rarely, one fetch per hour and container is plenty
+JWKS_TTL = 3600
+# Tokens with made up kids must not turn into one jwks request each
+JWKS_MIN_REFRESH_INTERVAL = 30
+# A page load sends the same token for every asset, a few hundred users per container
+# already cover most repeated requests
+VERIFIED_TOKENS_MAXSIZE = 512
+
+# Uri prefixes and who may access them. A "{sub}" segment matches the tokens sub and a
+# "{group}" segment the md5 hash of one of its cognito groups. Rules without "subs" and
+# "groups" allow everyone whose token matches the prefix.
+ROUTE_RULES: List[Dict] = [
+    {"prefix": "/{sub}/"},
+    {"prefix": "/groups/{group}/"},
+]
+
+# Log the time spent per handler stage, one CloudWatch embedded metric format (EMF) line
+# per request. CloudWatch extracts the metrics from the log, no agent or api call needed.
+STAGE_TIMINGS = False
+STAGE_TIMINGS_NAMESPACE = "EdgeAuth"
+
+
+class TokenVerificationException(Exception):
+    """Raised when token verification fails, taken from https://github.com/pvizeli/pycognito."""
+
+
+class StageTimer:
+    """Records the time spent per stage of a request with the monotonic perf_counter,
+    each `mark` closes the stage that started at the previous one.
+    """
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def emit(self, outcome: str) -> None:
+        """Print the timings as EMF, milliseconds per stage plus the total"""
+        import json
+
+        timings = {f"{stage}_ms": sec * 1000 for stage, sec in self.stages.items()}
+        timings["total_ms"] = (time.perf_counter() - self.started) * 1000
+        emf = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": STAGE_TIMINGS_NAMESPACE,
+                        "Dimensions": [["outcome"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": "Milliseconds"} for name in timings
+                        ],
+                    }
+                ],
+            },
+            "outcome": outcome,
+            **{name: round(ms, 4) for name, ms in timings.items()},
+        }
+        print(json.dumps(emf))
+
+
+class NullStageTimer:
+    """Stands in for StageTimer while STAGE_TIMINGS is off, so the handler pays one no-op
+    call per stage and nothing else
+    """
+
+    def mark(self, stage: str) -> None:  # noqa: U100
+        pass
+
+    def emit(self, outcome: str) -> None:  # noqa: U100
+        pass
+
+
+NULL_STAGE_TIMER = NullStageTimer()
+
+
+class JWKSCache:
+    """Holds the pools JWKS indexed by kid. Instances live at module level, so they
+    survive warm invocations of the same lambda container.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        ttl: float = JWKS_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+    ):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.keys_by_kid: Dict[str, Dict] = {}
+        self.prepared_keys_by_kid: Dict[str, "Key"] = {}
+        self.fetched_at: Optional[float] = None
+        self.fetches = 0
+
+    def fetch(self) -> Dict:
+        """Get the JWKS json, the timeout keeps a slow IDP from blocking requests"""
+        import json
+        import urllib.request
+
+        with urllib.request.urlopen(self.jwks_url, timeout=5) as response:
+            return json.load(response)
+
+    def refresh(self) -> None:
+        jwks = self.fetch()
+        self.keys_by_kid = {key["kid"]: key for key in jwks.get("keys", [])}
+        self.prepared_keys_by_kid = {}
+        self.fetched_at = time.monotonic()
+        self.fetches += 1
+
+    @property
+    def age(self) -> float:
+        return (
+            float("inf")
+            if self.fetched_at is None
+            else time.monotonic() - self.fetched_at
+        )
+
+    def get_keys(self) -> Dict:
+        """Get the JWKS in the same format as TokenVerifier.get_keys"""
+        if self.age > self.ttl:
+            self.refresh()
+        return {"keys": list(self.keys_by_kid.values())}
+
+    def get_key(self, kid: str) -> Dict:
+        """Get a key by kid, an unknown kid triggers a refresh (keys might be rotated)"""
+        if self.age > self.ttl:
+            self.refresh()
+        key = self.keys_by_kid.get(kid)
+        if key is None and self.age >= self.min_refresh_interval:
+            self.refresh()
+            key = self.keys_by_kid.get(kid)
+        if key is None:
+            raise TokenVerificationException(f"No key found for kid {kid!r}.")
+        return key
+
+    def get_prepared_key(self, kid: str) -> "Key":
+        """Get the public key object for kid, the RSA key material is parsed once per
+        fetched JWKS instead of once per jwt.decode
+        """
+        key = self.get_key(kid)
+        prepared_key = self.prepared_keys_by_kid.get(kid)
+        if prepared_key is None:
+            from jose import jwk
+
+            prepared_key = jwk.construct(key, key.get("alg", "RS256"))
+            self.prepared_keys_by_kid[kid] = prepared_key
+        return prepared_key
+
+
+# One cache per jwks url and process
+jwks_caches: Dict[str, JWKSCache] = {}
+
+
+def get_jwks_cache(jwks_url: str) -> JWKSCache:
+    if jwks_url not in jwks_caches:
+        jwks_caches[jwks_url] = JWKSCache(jwks_url)
+    return jwks_caches[jwks_url]
+
+
+class CachedTokenVerifier:
+    """TokenVerifier of example_001 reading prepared keys from the process wide JWKSCache,
+    issuer and decode options are computed once, so verify_token only checks signature
+    and claims.
+    """
+
+    def __init__(
+        self,
+        user_pool_id: str,
+        client_id: str,
+        pool_region: str,
+        jwks_cache: Optional[JWKSCache] = None,
+    ):
+        self.user_pool_id = user_pool_id
+        self.client_id = client_id
+        self.pool_region = pool_region
+        self.jwks_cache = jwks_cache or get_jwks_cache(self.user_pool_jwks_url)
+        self.issuer = self.user_pool_url
+        self.decode_options = {
+            token_use: {
+                "require_aud": token_use != "access",
+                "require_iss": True,
+                "require_exp": True,
+            }
+            for token_use in ("access", "id")
+        }
+
+    @property
+    def user_pool_url(self):
+        """Construct the user pools url (details at: https://github.com/pvizeli/pycognito)"""
+        return f"https://cognito-idp.{self.pool_region}.amazonaws.com/{self.user_pool_id}"
+
+    @property
+    def user_pool_jwks_url(self) -> str:
+        """Construct the user pools jwks url (details at: https://github.com/pvizeli/pycognito)"""
+        return f"{self.user_pool_url}/.well-known/jwks.json"
+
+    def prime(self) -> None:
+        """Fetch the JWKS and prepare its keys (loads jose) ahead of the first request"""
+        self.jwks_cache.refresh()
+        for kid in self.jwks_cache.keys_by_kid:
+            self.jwks_cache.get_prepared_key(kid)
+
+    def get_keys(self) -> Dict:
+        return self.jwks_cache.get_keys()
+
+    def get_key(self, kid) -> Dict:
+        return self.jwks_cache.get_key(kid)
+
+    def verify_token(
+        self,
+        token: str,
+        id_name: str = "access_token",
+        token_use: str = "access",
+        timer: Union[StageTimer, NullStageTimer] = NULL_STAGE_TIMER,
+    ) -> Dict:
+        """Same checks as TokenVerifier.verify_token with prepared key and options"""
+        from jose import jwt
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        public_key = self.jwks_cache.get_prepared_key(kid)
+        timer.mark("jwks")
+        try:
+            verified = jwt.decode(
+                token,
+                public_key,
+                algorithms=["RS256"],
+                audience=self.client_id,
+                issuer=self.issuer,
+                options=self.decode_options[token_use],
+            )
+        except JWTError:
+            raise TokenVerificationException(
+                f"Your {id_name!r} token could not be verified."
+            ) from None
+        finally:
+            timer.mark("decode")
+
+        if verified.get("token_use") != token_use:
+            raise TokenVerificationException(
+                f"Your {id_name!r} token use ({token_use!r}) could not be verified."
+            )
+
+        return verified
+
+
+class VerifiedTokenCache:
+    """LRU cache for claims of tokens that passed verification and check_token_access,
+    or anything else derived from them. Entries are keyed by the tokens sha256 digest and
+    are dropped at the tokens 'exp'.
+    """
+
+    def __init__(self, maxsize: int = VERIFIED_TOKENS_MAXSIZE):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[bytes, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        import hashlib
+
+        return hashlib.sha256(token.encode("utf8")).digest()
+
+    def get(self, token: str) -> Optional[Any]:
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, value: Any, exp: Optional[float] = None) -> None:
+        """Keep `value` until `exp`, by default the 'exp' claim of `value`"""
+        self.entries[self.digest(token)] = (value["exp"] if exp is None else exp, value)
+        if len(self.entries) > self.maxsize:
+            now = time.time()
+            # Make room by dropping expired tokens first, least recently used after that
+            for key in [k for k, (e, _) in self.entries.items() if e <= now]:
+                del self.entries[key]
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+@lru_cache(maxsize=1024)
+def hash_group(group: str) -> str:
+    """Path segment of a cognito group, hashed once per group name and container"""
+    import hashlib
+
+    return hashlib.md5(group.encode("utf8")).hexdigest()
+
+
+class RouteNode:
+    """Path segment in the RouteMatcher trie and who is granted access below it"""
+
+    __slots__ = ("children", "sub_child", "group_child", "grant_all", "subs", "groups")
+
+    def __init__(self):
+        self.children: Dict[str, "RouteNode"] = {}
+        self.sub_child: Optional["RouteNode"] = None
+        self.group_child: Optional["RouteNode"] = None
+        self.grant_all = False
+        self.subs: Set[str] = set()
+        self.groups: Set[str] = set()
+
+
+class RouteMatcher:
+    """Trie of uri path segments compiled from ROUTE_RULES. Authorizing a request walks
+    the requested path once, so it takes O(path length) no matter how many rules exist.
+    """
+
+    def __init__(self, rules: Iterable[Dict], group_modifier: Callable = hash_group):
+        self.root = RouteNode()
+        self.group_modifier = group_modifier
+        for rule in rules:
+            self.add_rule(rule["prefix"], rule.get("subs"), rule.get("groups"))
+
+    def add_rule(
+        self,
+        prefix: str,
+        subs: Optional[Iterable[str]] = None,
+        groups: Optional[Iterable[str]] = None,
+    ) -> None:
+        node = self.root
+        for segment in prefix.strip("/").split("/"):
+            if segment == "{sub}":
+                node.sub_child = node.sub_child or RouteNode()
+                node = node.sub_child
+            elif segment == "{group}":
+                node.group_child = node.group_child or RouteNode()
+                node = node.group_child
+            elif segment:
+                node = node.children.setdefault(segment, RouteNode())
+        if subs is None and groups is None:
+            node.grant_all = True
+        node.subs.update(subs or ())
+        node.groups.update(groups or ())
+
+    def is_authorized(self, uri: str, sub: str, groups: Iterable[str] = ()) -> bool:
+        groups = set(groups)
+        hashed_groups = {self.group_modifier(group) for group in groups}
+
+        def granted(node: RouteNode) -> bool:
+            if node.grant_all or sub in node.subs:
+                return True
+            return not node.groups.isdisjoint(groups)
+
+        nodes = [self.root]
+        for segment in uri.strip("/").split("/"):
+            next_nodes = []
+            for node in nodes:
+                if granted(node):
+                    return True
+                if segment in node.children:
+                    next_nodes.append(node.children[segment])
+                if node.sub_child is not None and segment == sub:
+                    next_nodes.append(node.sub_child)
+                if node.group_child is not None and segment in hashed_groups:
+                    next_nodes.append(node.group_child)
+            if not next_nodes:
+                return False
+            nodes = next_nodes
+        return any(granted(node) for node in nodes)
+
+
+def check_headers(headers: Dict) -> Union[str, bool]:
+    """Check header content for 'Authorization: Bearer <token>' in request
+    authorization (key, values).
+    """
+    if "authorization" not in headers.keys():
+        return False
+    # Needs only one auth header. Change this when required.
+    if not len(headers["authorization"]) == 1:
+        return False
+    auth_values = headers["authorization"][0]["value"].split()
+    if not (
+        len(auth_values) == 2 and auth_values[0].lower() == "bearer" and auth_values[1]
+    ):
+        return False
+    return auth_values[1]
+
+
+def check_token_access(access_token: Dict) -> bool:
+    """Check token contents (user_info and expectation)"""
+    # Check if all required user_info is present in token
+    if any(access_token.get(user_info) is None for user_info in required_user_info):
+        return False
+    # Check if the token content matches expectation
+    return (
+        access_token["token_use"] == "access"
+        and access_token["iss"] == token_verifier.issuer
+        and access_token["client_id"] == CLIENTID
+    )
+
+
+def check_authorized_route(cloud_front_request: Dict, token: Dict) -> bool:
+    """Checks if the requested route is granted to the tokens 'sub' or 'cognito:groups'"""
+    return route_matcher.is_authorized(
+        cloud_front_request["uri"], token["sub"], token.get("cognito:groups") or ()
+    )
+
+
+def modify_request(cloud_front_request: Dict) -> Dict:
+    """Remove header from viewer request for cloudfronts origin request"""
+    del cloud_front_request["headers"]["authorization"]
+    return cloud_front_request
+
+
+# Created once per container instead of once per request
+token_verifier = CachedTokenVerifier(USERPOOLID, CLIENTID, REGION)
+verified_tokens = VerifiedTokenCache()
+route_matcher = RouteMatcher(ROUTE_RULES)
+if PRIME_ON_INIT and USERPOOLID:
+    try:
+        token_verifier.prime()
+    except Exception as e:
+        # Not fatal, the first request fetches the keys again
+        print("An error occured (priming jwks failed):")
+        print(e)
+
+
+def lambda_handler(event, context):
+    """Lambda handler"""
+    timer = StageTimer() if STAGE_TIMINGS else NULL_STAGE_TIMER
+    cf_request = event["Records"][0]["cf"]["request"]
+    headers = cf_request["headers"]
+    header_check = check_headers(headers)
+    timer.mark("headers")
+    if isinstance(header_check, bool) and header_check is False:
+        print("An error occured (invalid header):")
+        timer.emit("invalid_header")
+        return DEFAULT_RESPONE
+    token_string = header_check
+    decoded_token = verified_tokens.get(token_string)
+    timer.mark("token_cache")
+    if decoded_token is None:
+        try:
+            decoded_token = token_verifier.verify_token(
+                token_string, "access_token", "access", timer
+            )
+        except (TokenVerificationException, JWTError, JWSError) as e:
+            print("An error occured (token verfication failed):")
+            print(e)
+            timer.emit("invalid_token")
+            return DEFAULT_RESPONE
+        token_access = check_token_access(decoded_token)
+        timer.mark("claims")
+        if not token_access:
+            print("An error occured (unauthorized token content):")
+            timer.emit("unauthorized_token")
+            return DEFAULT_RESPONE
+        verified_tokens.put(token_string, decoded_token)
+    print(f"Token cache: {verified_tokens.hits} hits, {verified_tokens.misses} misses")
+    # Just an example of using the requested path
+    authorized_route = check_authorized_route(cf_request, decoded_token)
+    timer.mark("route")
+    if not authorized_route:
+        print("Unauthorized sub in access_token:")
+        timer.emit("unauthorized_route")
+        return DEFAULT_RESPONE
+    response = modify_request(cf_request)
+    print(response)
+    timer.emit("authorized")
+    return response
@@ -0,0 +1,122 @@
+""" Local RSA keys, cognito like tokens, a JWKS stub server and a micro-benchmark for
+TokenVerifier """
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Tuple
+
+import rsa
+from jose import jwk, jwt
+
+from python_examples.oauth_at_cloudfront.example_001 import TokenVerifier
+from python_examples.oauth_at_cloudfront.example_002 import (
+    CachedTokenVerifier,
+    JWKSCache,
+    VerifiedTokenCache,
+)
+
+REGION = "eu-central-1"
+USERPOOLID = "eu-central-1_local"
+CLIENTID = "local-client-id"
+
+
+def generate_signing_key(kid: str = "local-key") -> Tuple[bytes, Dict]:
+    """Generate a RSA private key (PEM) and its public JWK, like an entry of a JWKS"""
+    _, private_key = rsa.newkeys(2048)
+    private_pem = private_key.save_pkcs1()
+    public_jwk = jwk.construct(private_pem, "RS256").public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig"})
+    return private_pem, public_jwk
+
+
+def issue_token(private_pem: bytes, kid: str, **claims) -> str:
+    """Issue an access token looking like the ones of cognito, claims override defaults"""
+    now = int(time.time())
+    payload = {
+        "sub": "11111111-2222-3333-4444-555555555555",
+        "cognito:groups": ["users"],
+        "token_use": "access",
+        "scope": "openid",
+        "auth_time": now,
+        "iss": f"https://cognito-idp.{REGION}.amazonaws.com/{USERPOOLID}",
+        "exp": now + 3600,
+        "iat": now,
+        "client_id": CLIENTID,
+        "username": "local-user",
+    }
+    payload.update(claims)
+    return jwt.encode(payload, private_pem, algorithm="RS256", headers={"kid": kid})
+
+
+def serve_jwks(jwks: Dict) -> Tuple[HTTPServer, str]:
+    """Serve `jwks` (the dict can be changed while serving) from a local stub server"""
+
+    class JWKSHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            body = json.dumps(jwks).encode("utf8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # noqa: U100
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), JWKSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/.well-known/jwks.json"
+
+
+def verifications_per_second(
+    verifier: TokenVerifier, token: str, seconds: float
+) -> float:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        verifier.verify_token(token, "access_token", "access")
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    signing_key, public_key = generate_signing_key()
+    jwks = {"keys": [public_key]}
+    access_token = issue_token(signing_key, public_key["kid"])
+    stub_server, stub_url = serve_jwks(jwks)
+
+    # The JWKS is fetched once, again after the ttl or for an unknown kid
+    cache = JWKSCache(stub_url, ttl=0.5, min_refresh_interval=0.1)
+    for _ in range(1000):
+        cache.get_key(public_key["kid"])
+    print("Fetches after 1000 lookups:", cache.fetches)
+    # Fetches after 1000 lookups: 1
+    rotated_key, rotated_public_key = generate_signing_key("rotated-key")
+    jwks["keys"].append(rotated_public_key)
+    time.sleep(0.1)
+    cache.get_key("rotated-key")
+    print("Fetches after key rotation:", cache.fetches)
+    # Fetches after key rotation: 2
+    time.sleep(0.5)
+    cache.get_key(public_key["kid"])
+    print("Fetches after ttl expired:", cache.fetches)
+    # Fetches after ttl expired: 3
+
+    # Verified tokens are kept until they expire
+    tokens = VerifiedTokenCache(maxsize=2)
+    tokens.put("token-a", {"sub": "a", "exp": time.time() + 3600})
+    tokens.put("token-b", {"sub": "b", "exp": time.time() - 1})
+    tokens.put("token-c", {"sub": "c", "exp": time.time() + 3600})
+    print([tokens.get(t) is not None for t in ("token-a", "token-b", "token-c")])
+    # [True, False, True]
+
+    plain_verifier = TokenVerifier(USERPOOLID, CLIENTID, REGION, pool_jwk=jwks)
+    cached_verifier = CachedTokenVerifier(
+        USERPOOLID, CLIENTID, REGION, jwks_cache=JWKSCache(stub_url)
+    )
+    before = verifications_per_second(plain_verifier, access_token, 2.0)
+    after = verifications_per_second(cached_verifier, access_token, 2.0)
+    print(f"TokenVerifier:       {before:8.0f} verifications/s")
+    print(f"CachedTokenVerifier: {after:8.0f} verifications/s ({after / before:.2f}x)")
+    stub_server.shutdown()
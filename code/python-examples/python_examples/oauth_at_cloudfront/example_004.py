@@ -0,0 +1,80 @@
+""" Import time profile of the lambda module, reports the cold start cost per import """
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+LAMBDA_MODULE = "python_examples.oauth_at_cloudfront.example_002"
+
+
+def run_importtime(statement: str) -> List[Dict]:
+    """Run `statement` in a fresh interpreter with `-X importtime`, which prints one line
+    per imported module: 'import time: <self us> | <cumulative us> | <name>'.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports: List[Dict] = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        imports.append(
+            {
+                "name": name.strip(),
+                # Nesting depth is given by the indentation of the name
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+    return imports
+
+
+def profile_imports(module: str = LAMBDA_MODULE) -> Dict:
+    """Profile importing `module`, without the modules the interpreter loads anyway"""
+    startup = {i["name"] for i in run_importtime("pass")}
+    started = time.perf_counter()
+    imports = [i for i in run_importtime(f"import {module}") if i["name"] not in startup]
+    wall_ms = (time.perf_counter() - started) * 1000
+    import_ms = sum(i["cumulative_ms"] for i in imports if i["depth"] == 0)
+    return {
+        "module": module,
+        "interpreter_wall_ms": round(wall_ms, 3),
+        "import_ms": round(import_ms, 3),
+        "imports": sorted(
+            (i for i in imports if i["depth"] <= 1),
+            key=lambda i: i["cumulative_ms"],
+            reverse=True,
+        ),
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--module", default=LAMBDA_MODULE)
+    arg_parser.add_argument("--top", type=int, default=15)
+    arg_parser.add_argument(
+        "--json", action="store_true", help="Print the profile as json"
+    )
+    arg_parser.add_argument(
+        "--budget-ms", type=float, help="Exit with 1 if importing takes longer (for CI)"
+    )
+    args = arg_parser.parse_args()
+
+    profile = profile_imports(args.module)
+    if args.json:
+        print(json.dumps(profile, indent=2))
+    else:
+        for entry in profile["imports"][: args.top]:
+            indent = "  " * entry["depth"]
+            print(f"{entry['cumulative_ms']:10.3f}ms  {indent}{entry['name']}")
+        print(f"{profile['import_ms']:10.3f}ms  total ({args.module})")
+    if args.budget_ms is not None and profile["import_ms"] > args.budget_ms:
+        print(f"Import time exceeds budget of {args.budget_ms}ms", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,77 @@
+""" Benchmark of the compiled RouteMatcher against substring checks for thousands of
+rules """
+import random
+import time
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+from python_examples.oauth_at_cloudfront.example_002 import RouteMatcher, hash_group
+
+
+def generate_rules(users: int, groups: int) -> Tuple[List[Dict], List[str], List[str]]:
+    """Every user owns a folder and shares a report folder with one group"""
+    subs = [str(uuid.uuid4()) for _ in range(users)]
+    group_names = [f"group-{g}" for g in range(groups)]
+    rules = [{"prefix": "/{sub}/"}, {"prefix": "/groups/{group}/"}]
+    for sub in subs:
+        shared_with = [random.choice(group_names)]
+        rules.append({"prefix": f"/reports/{sub}/", "subs": [sub], "groups": shared_with})
+    return rules, subs, group_names
+
+
+def substring_is_authorized(rules: List[Dict]) -> Callable:
+    """The check of example_001 applied to every rule, scanning all rules per request"""
+
+    def is_authorized(uri: str, sub: str, groups: List[str]) -> bool:
+        for rule in rules:
+            prefix = rule["prefix"].replace("{sub}", sub)
+            if "{group}" in prefix:
+                if any(prefix.replace("{group}", hash_group(g)) in uri for g in groups):
+                    return True
+            elif prefix in uri and (
+                ("subs" not in rule and "groups" not in rule)
+                or sub in rule.get("subs", ())
+                or set(groups).intersection(rule.get("groups", ()))
+            ):
+                return True
+        return False
+
+    return is_authorized
+
+
+def checks_per_second(
+    is_authorized: Callable, requests: List[Tuple], seconds: float
+) -> float:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for uri, sub, groups in requests:
+            is_authorized(uri, sub, groups)
+        count += len(requests)
+    return count / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    random.seed(42)
+    route_rules, user_subs, all_groups = generate_rules(users=5000, groups=200)
+    sample = []
+    for _ in range(1000):
+        user, group = random.choice(user_subs), random.choice(all_groups)
+        sample += [
+            (f"/{user}/images/cat.jpg", user, [group]),
+            (f"/groups/{hash_group(group)}/deck.pdf", user, [group]),
+            (f"/reports/{random.choice(user_subs)}/q3.csv", user, [group]),
+        ]
+
+    started = time.perf_counter()
+    matcher = RouteMatcher(route_rules)
+    print(f"Compiled {len(route_rules)} rules in {time.perf_counter() - started:.3f}s")
+    substring_check = substring_is_authorized(route_rules)
+    assert all(
+        matcher.is_authorized(*request) == substring_check(*request)
+        for request in sample[:300]
+    )
+    before = checks_per_second(substring_check, sample[:30], 2.0)
+    after = checks_per_second(matcher.is_authorized, sample, 2.0)
+    print(f"Substring checks: {before:10.0f} checks/s")
+    print(f"RouteMatcher:     {after:10.0f} checks/s ({after / before:.0f}x)")
@@ -0,0 +1,160 @@
+""" Local load test of the cached lambda_handler with synthetic CloudFront requests """
+import argparse
+import concurrent.futures
+import copy
+import json
+import os
+import pathlib
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from python_examples.oauth_at_cloudfront import example_002 as edge_lambda
+from python_examples.oauth_at_cloudfront.example_003 import (
+    CLIENTID,
+    REGION,
+    USERPOOLID,
+    generate_signing_key,
+    issue_token,
+    serve_jwks,
+)
+
+SAMPLE_EVENT = json.loads(
+    (pathlib.Path(__file__).parent / "sample_event.json").read_text()
+)
+# Share of each token kind in the generated traffic
+TOKEN_MIX = {"valid": 0.85, "expired": 0.05, "malformed": 0.05, "wrong_audience": 0.05}
+
+
+def configure_lambda(jwks_url: str, stage_timings: bool = False) -> None:
+    """Point the lambda module at the local user pool and its stub JWKS"""
+    edge_lambda.STAGE_TIMINGS = stage_timings
+    edge_lambda.REGION, edge_lambda.USERPOOLID, edge_lambda.CLIENTID = (
+        REGION,
+        USERPOOLID,
+        CLIENTID,
+    )
+    edge_lambda.token_verifier = edge_lambda.CachedTokenVerifier(
+        USERPOOLID, CLIENTID, REGION, jwks_cache=edge_lambda.JWKSCache(jwks_url)
+    )
+    edge_lambda.verified_tokens = edge_lambda.VerifiedTokenCache()
+    edge_lambda.token_verifier.prime()
+    # The handler logs every request, which would dominate the measurement
+    sys.stdout = open(os.devnull, "w")
+
+
+def generate_tokens(signing_key: bytes, kid: str, users: int) -> Dict[str, List]:
+    """Tokens per kind as (sub, token), valid ones are reused like browsers do"""
+    subs = [f"user-{u:05d}" for u in range(users)]
+    return {
+        "valid": [(sub, issue_token(signing_key, kid, sub=sub)) for sub in subs],
+        "expired": [
+            (sub, issue_token(signing_key, kid, sub=sub, exp=int(time.time()) - 60))
+            for sub in subs
+        ],
+        "malformed": [(sub, f"{sub}.not-a.jwt") for sub in subs],
+        "wrong_audience": [
+            (sub, issue_token(signing_key, kid, sub=sub, client_id="another-client"))
+            for sub in subs
+        ],
+    }
+
+
+def generate_events(tokens: Dict[str, List], requests: int) -> List[Tuple[str, Dict]]:
+    kinds = random.choices(list(TOKEN_MIX), weights=list(TOKEN_MIX.values()), k=requests)
+    events = []
+    for kind in kinds:
+        sub, token = random.choice(tokens[kind])
+        event = copy.deepcopy(SAMPLE_EVENT)
+        request = event["Records"][0]["cf"]["request"]
+        request["uri"] = f"/{sub}/images/{random.randint(0, 50)}.jpg"
+        request["headers"]["authorization"][0]["value"] = f"Bearer {token}"
+        events.append((kind, event))
+    return events
+
+
+def timed_request(kind_event: Tuple[str, Dict]) -> Tuple[str, bool, float]:
+    kind, event = kind_event
+    started = time.perf_counter()
+    response = edge_lambda.lambda_handler(event, None)
+    elapsed = time.perf_counter() - started
+    return kind, "status" not in response, elapsed
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def run_load_test(
+    events: List[Tuple[str, Dict]],
+    jwks_url: str,
+    concurrency: int,
+    processes: bool,
+    stage_timings: bool = False,
+) -> Dict:
+    # Threads share one lambda module like concurrent requests would share a container,
+    # processes behave like separate containers (each with its own caches).
+    if processes:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            concurrency, initializer=configure_lambda, initargs=(jwks_url, stage_timings)
+        )
+    else:
+        stdout = sys.stdout
+        configure_lambda(jwks_url, stage_timings)
+        pool = concurrent.futures.ThreadPoolExecutor(concurrency)
+    started = time.perf_counter()
+    with pool:
+        results = list(pool.map(timed_request, events, chunksize=64 if processes else 1))
+    wall = time.perf_counter() - started
+    if not processes:
+        sys.stdout = stdout
+
+    latencies = sorted(elapsed for _, _, elapsed in results)
+    report = {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "mode": "processes" if processes else "threads",
+        "requests_per_second": round(len(results) / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "by_token": {},
+    }
+    for kind in TOKEN_MIX:
+        outcomes = [passed for k, passed, _ in results if k == kind]
+        report["by_token"][kind] = {"requests": len(outcomes), "passed": sum(outcomes)}
+    return report
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--requests", type=int, default=5000)
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--users", type=int, default=50)
+    arg_parser.add_argument(
+        "--processes", action="store_true", help="Run workers as processes, not threads"
+    )
+    arg_parser.add_argument(
+        "--stage-timings", action="store_true", help="Enable the EMF stage timings"
+    )
+    args = arg_parser.parse_args()
+
+    random.seed(42)
+    private_key, public_key = generate_signing_key()
+    stub_server, stub_url = serve_jwks({"keys": [public_key]})
+    token_kinds = generate_tokens(private_key, public_key["kid"], args.users)
+    viewer_requests = generate_events(token_kinds, args.requests)
+    print(
+        json.dumps(
+            run_load_test(
+                viewer_requests,
+                stub_url,
+                args.concurrency,
+                args.processes,
+                args.stage_timings,
+            ),
+            indent=2,
+        )
+    )
+    stub_server.shutdown()
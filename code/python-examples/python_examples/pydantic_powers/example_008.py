@@ -0,0 +1,48 @@
+""" SecretSettings of example_007 reading both keys with one call of the shared
+secrets provider """
+import os
+from typing import Dict, Optional
+
+from pydantic import BaseSettings, SecretStr, root_validator
+
+from python_examples.sign_cf_cookies.example_009 import get_secrets_provider
+
+KEY_SECRETS = ("SECRETS_NAME_PRIVATE_KEY", "SECRETS_NAME_PUBLIC_KEY")
+
+
+class SecretSettings(BaseSettings):
+    SECRET_REGION: Optional[str] = os.getenv("SECRET_REGION") or "eu-central-1"
+    PRIVATE_KEY: Optional[SecretStr] = None
+    PUBLIC_KEY: Optional[SecretStr] = None
+
+    @root_validator
+    def val_private_key(cls, values: Dict):  # noqa
+        secrets = get_secrets_provider(values["SECRET_REGION"]).get_many(KEY_SECRETS)
+        private_key_secret, public_key_secret = secrets.values()
+        return {
+            "PRIVATE_KEY": private_key_secret,
+            "PUBLIC_KEY": public_key_secret,
+        }
+
+    class Config:
+        env_file = ".env.dev.cf"
+        env_file_encoding = "utf-8"
+
+
+if __name__ == "__main__":
+    import boto3
+    from moto import mock_secretsmanager
+
+    with mock_secretsmanager():
+        client = boto3.client("secretsmanager", region_name="eu-central-1")
+        client.create_secret(Name=KEY_SECRETS[0], SecretString="-----BEGIN RSA ...")
+        client.create_secret(Name=KEY_SECRETS[1], SecretString="-----BEGIN PUBLIC ...")
+
+        settings = SecretSettings()
+        print(settings.PRIVATE_KEY)
+        # **********
+        print(settings.PRIVATE_KEY.get_secret_value())
+        # -----BEGIN RSA ...
+        # Later settings in this process are served from memory
+        print(SecretSettings().PUBLIC_KEY.get_secret_value())
+        # -----BEGIN PUBLIC ...
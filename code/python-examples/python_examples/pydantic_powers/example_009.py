@@ -0,0 +1,125 @@
+""" Bulk variant of S3Uri (example_004) for millions of uris, e.g. the keys of an S3
+inventory manifest. One pass over plain strings without a model per uri, the results
+are columns of numpy arrays. """
+import typing
+
+import numpy as np
+from pydantic import ValidationError
+
+from python_examples.pydantic_powers.example_004 import S3Uri
+
+S3_PREFIX = "s3://"
+S3_PREFIX_LENGTH = len(S3_PREFIX)
+
+
+class S3UriColumns(typing.NamedTuple):
+    bucket: np.ndarray  # dtype object, None where S3Uri has None or fails
+    path: np.ndarray
+    key: np.ndarray
+    error: np.ndarray  # dtype bool, True where S3Uri fails
+
+
+def parse_with_model(
+    uri: typing.Any,
+) -> typing.Tuple[typing.Optional[str], typing.Optional[str], typing.Optional[str], bool]:
+    try:
+        s3_uri = S3Uri(uri=uri)
+    except (ValidationError, AttributeError, TypeError):
+        # Without a valid uri S3Uri's root validator fails on None instead of raising a
+        # ValidationError
+        return None, None, None, True
+    return s3_uri.bucket, s3_uri.path, s3_uri.key, False
+
+
+def parse_s3_uris(uris: typing.Iterable[str]) -> S3UriColumns:
+    """Parses `uris` like S3Uri(uri=...) would. Note that S3Uri only enforces the
+    scheme on a plain uri, the field validators of bucket, path and key are not run on
+    the values of its root validator. Missing uris (None) are errors, anything else
+    but str is handed to S3Uri itself.
+    """
+    buckets, paths, keys, errors = [], [], [], []
+    for uri in uris:
+        if uri is None:
+            bucket, path, key, error = None, None, None, True
+        elif not isinstance(uri, str):
+            bucket, path, key, error = parse_with_model(uri)
+        elif uri.startswith(S3_PREFIX):
+            # Same as uri.split("/") in S3Uri: bucket is part 2, path the parts after it
+            # and key the last part, if it contains a "."
+            bucket, separator, path = uri[S3_PREFIX_LENGTH:].partition("/")
+            if not separator:
+                path = None
+            last_part = uri.rpartition("/")[2]
+            key = last_part if "." in last_part else None
+            error = False
+        else:
+            bucket, path, key, error = None, None, None, True
+        buckets.append(bucket)
+        paths.append(path)
+        keys.append(key)
+        errors.append(error)
+    return S3UriColumns(
+        bucket=object_array(buckets),
+        path=object_array(paths),
+        key=object_array(keys),
+        error=np.array(errors, dtype=bool),
+    )
+
+
+def object_array(values: typing.List[typing.Optional[str]]) -> np.ndarray:
+    # np.array(values, dtype=object) would nest sequences, fill a 1d array instead
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def generate_uris(n: int, seed: int = 0) -> typing.List[str]:
+    """Random uris around the edge cases of S3Uri: schemes, empty parts, dots in
+    bucket, path and key, duplicated or trailing slashes and odd characters
+    """
+    import random
+
+    rng = random.Random(seed)
+    schemes = ["s3://", "S3://", "s3:/", "s3:", "s3", "http://", "", " s3://", "s3:///"]
+    alphabet = "ab3-_ .:/é\x00"
+
+    def part() -> str:
+        return "".join(rng.choices(alphabet, k=rng.randint(0, 6)))
+
+    uris = []
+    for _ in range(n):
+        scheme = rng.choice(schemes) if rng.random() < 0.3 else S3_PREFIX
+        parts = [part() for _ in range(rng.randint(0, 4))]
+        if parts and rng.random() < 0.5:
+            parts[-1] += rng.choice([".json", ".", ".tar.gz", ""])
+        uris.append(scheme + "/".join(parts))
+    return uris
+
+
+if __name__ == "__main__":
+    import time
+
+    columns = parse_s3_uris(["s3://bucket/folder/key.json", "s3://bucket", "gs://b/k"])
+    print(columns.bucket, columns.path)
+    # ['bucket' 'bucket' None] ['folder/key.json' None None]
+    print(columns.key, columns.error)
+    # ['key.json' None None] [False False  True]
+
+    corpus = generate_uris(20000) + [None, 1, b"s3://bytes/key.json", "s3://np/x.y"]
+    columns = parse_s3_uris(corpus)
+    expected = [parse_with_model(uri) for uri in corpus]
+    assert list(zip(*columns)) == [
+        (bucket, path, key, np.bool_(error)) for bucket, path, key, error in expected
+    ]
+    print(f"{len(corpus)} uris parsed like S3Uri, {columns.error.sum()} errors")
+
+    uris = [f"s3://bucket-{i % 7}/year=2022/part-{i}.parquet" for i in range(100000)]
+    started = time.perf_counter()
+    for uri in uris:
+        parse_with_model(uri)
+    model_rate = len(uris) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    parse_s3_uris(uris)
+    bulk_rate = len(uris) / (time.perf_counter() - started)
+    print(f"S3Uri         {model_rate:10.0f} uris/s")
+    print(f"parse_s3_uris {bulk_rate:10.0f} uris/s")
@@ -0,0 +1,193 @@
+""" sign_cookie of example_004, but the private key and CloudFrontSigner are loaded once
+per process and only rebuilt when the secrets rotate. Signatures are computed by
+OpenSSL through cryptography if installed, the pure python rsa package otherwise. """
+import datetime
+import functools
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import rsa
+from botocore.signers import CloudFrontSigner
+
+try:
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:
+    serialization = None
+
+if TYPE_CHECKING:
+    from python_examples.sign_cf_cookies.example_003 import CFSettings
+
+# How long signed cookies grant access
+COOKIE_LIFETIME = datetime.timedelta(hours=2)
+
+
+class RSABackend:
+    """Signs with the pure python rsa package, like example_004"""
+
+    name = "rsa"
+
+    def __init__(self, private_key_pem: str):
+        key = rsa.PrivateKey.load_pkcs1(private_key_pem)
+        self.sign = functools.partial(rsa.sign, priv_key=key, hash_method="SHA-1")
+
+
+class CryptographyBackend:
+    """Signs with OpenSSL. PKCS#1 v1.5 signatures are deterministic, so they are byte
+    identical to the ones of RSABackend.
+    """
+
+    name = "cryptography"
+
+    def __init__(self, private_key_pem: str):
+        self.key = serialization.load_pem_private_key(
+            private_key_pem.encode("utf8"), password=None
+        )
+
+    def sign(self, message: bytes) -> bytes:
+        return self.key.sign(message, padding.PKCS1v15(), hashes.SHA1())
+
+
+SigningBackend = Union[RSABackend, CryptographyBackend]
+SIGNING_BACKENDS: Dict[str, Type[SigningBackend]] = {"rsa": RSABackend}
+if serialization is not None:
+    SIGNING_BACKENDS["cryptography"] = CryptographyBackend
+DEFAULT_SIGNING_BACKEND = "cryptography" if serialization is not None else "rsa"
+
+
+class CookieSigner:
+    """Parsed private key and CloudFrontSigner for one key pair. Signing keeps no state,
+    so one instance can be shared by all threads of FastAPI's threadpool.
+    """
+
+    def __init__(
+        self,
+        private_key_pem: str,
+        public_key_id: str,
+        backend: str = DEFAULT_SIGNING_BACKEND,
+    ):
+        self.private_key_pem = private_key_pem
+        self.public_key_id = public_key_id
+        self.backend: SigningBackend = SIGNING_BACKENDS[backend](private_key_pem)
+        self.signer = CloudFrontSigner(public_key_id, self.backend.sign)
+
+    def is_for(
+        self,
+        private_key_pem: str,
+        public_key_id: str,
+        backend: str = DEFAULT_SIGNING_BACKEND,
+    ) -> bool:
+        return (
+            self.private_key_pem == private_key_pem
+            and self.public_key_id == public_key_id
+            and self.backend.name == backend
+        )
+
+    def sign(self, resource_path: str, expires_at: datetime.datetime) -> Dict:
+        """Same cookies as example_004.sign_cookie"""
+        policy = self.signer.build_policy(resource_path, expires_at).encode("utf8")
+        signature = self.backend.sign(policy)
+        return {
+            "CloudFront-Policy": self.signer._url_b64encode(policy).decode("utf8"),
+            "CloudFront-Signature": self.signer._url_b64encode(signature).decode("utf8"),
+            "CloudFront-Key-Pair-Id": self.public_key_id,
+        }
+
+
+# One signer per process, replaced when the settings hold a different key pair
+cookie_signer: Optional[CookieSigner] = None
+cookie_signer_lock = threading.Lock()
+
+
+def get_key_pair(settings: "CFSettings") -> Tuple[str, str]:
+    return (
+        settings.COOKIE_SIGNING_PRIVATE_KEY.get_secret_value(),
+        settings.COOKIE_SIGNING_PUBLIC_KEY_ID.get_secret_value(),
+    )
+
+
+def get_cookie_signer(
+    settings: "CFSettings", backend: str = DEFAULT_SIGNING_BACKEND
+) -> CookieSigner:
+    """Get the process wide signer, the key is parsed again only after a rotation"""
+    global cookie_signer
+    key_pair = get_key_pair(settings)
+    signer = cookie_signer
+    if signer is None or not signer.is_for(*key_pair, backend):
+        with cookie_signer_lock:
+            # Another thread might have built it while this one waited
+            signer = cookie_signer
+            if signer is None or not signer.is_for(*key_pair, backend):
+                signer = CookieSigner(*key_pair, backend)
+                cookie_signer = signer
+    return signer
+
+
+def sign_cookie(
+    resource_path: str, settings: "CFSettings", backend: str = DEFAULT_SIGNING_BACKEND
+) -> Dict:
+    print("Generating cookie to access resource_path:", resource_path)
+    expires_at = datetime.datetime.now() + COOKIE_LIFETIME
+    return get_cookie_signer(settings, backend).sign(resource_path, expires_at)
+
+
+# Signer of an executor worker, which gets the key pair with every task
+worker_signer: Optional[CookieSigner] = None
+
+
+def sign_with_key_pair(
+    key_pair: Tuple[str, str],
+    resource_paths: Sequence[str],
+    expires_at: datetime.datetime,
+) -> List[Dict]:
+    """Sign cookies in an executor worker, lives here so a process pool only has to
+    import this module. The key is parsed once per process and key pair.
+    """
+    global worker_signer
+    signer = worker_signer
+    if signer is None or not signer.is_for(*key_pair):
+        signer = worker_signer = CookieSigner(*key_pair)
+    return [signer.sign(resource_path, expires_at) for resource_path in resource_paths]
+
+
+def sign_cookie_uncached(resource_path: str, settings: "CFSettings") -> Dict:
+    """example_004.sign_cookie with the settings passed in, for comparison"""
+    public_key_id = settings.COOKIE_SIGNING_PUBLIC_KEY_ID.get_secret_value()
+    expires_at = datetime.datetime.now() + COOKIE_LIFETIME
+    private_key_pem = settings.COOKIE_SIGNING_PRIVATE_KEY.get_secret_value()
+    key = rsa.PrivateKey.load_pkcs1(private_key_pem)
+    rsa_signer = functools.partial(rsa.sign, priv_key=key, hash_method="SHA-1")
+    signer = CloudFrontSigner(public_key_id, rsa_signer)
+    policy = signer.build_policy(resource_path, expires_at).encode("utf8")
+    signature = rsa_signer(policy)
+    return {
+        "CloudFront-Policy": signer._url_b64encode(policy).decode("utf8"),
+        "CloudFront-Signature": signer._url_b64encode(signature).decode("utf8"),
+        "CloudFront-Key-Pair-Id": public_key_id,
+    }
+
+
+if __name__ == "__main__":
+    from python_examples.sign_cf_cookies.example_006 import (
+        cookies_per_second,
+        local_settings,
+    )
+
+    settings = local_settings("K1")
+    before = cookies_per_second(sign_cookie_uncached, settings, 2.0)
+    print(f"Uncached sign_cookie: {before:8.1f} cookies/s")
+    for name in SIGNING_BACKENDS:
+        sign_with = functools.partial(sign_cookie, backend=name)
+        after = cookies_per_second(sign_with, settings, 2.0)
+        print(f"Cached sign_cookie ({name}): {after:8.1f} cookies/s")
+
+    # Threads share the signer, a rotated secret replaces it once
+    first_signer = cookie_signer
+    cookies_per_second(sign_cookie, settings, 0.5, threads=8)
+    print("Signer kept across threads:", cookie_signer is first_signer)
+    # Signer kept across threads: True
+    cookies_per_second(sign_cookie, local_settings("K2"), 0.5, threads=8)
+    print("Signer rebuilt after rotation:", cookie_signer is not first_signer)
+    # Signer rebuilt after rotation: True
+    print("Signs with key id:", cookie_signer.public_key_id)
+    # Signs with key id: K2
@@ -0,0 +1,123 @@
+""" Local stand-in for CFSettings and a parity check of the signing backends in
+example_005, every backend has to produce the same cookies byte for byte """
+import base64
+import concurrent.futures
+import contextlib
+import datetime
+import io
+import itertools
+import random
+import string
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import rsa
+from pydantic.types import SecretStr
+
+from python_examples.sign_cf_cookies.example_005 import (
+    DEFAULT_SIGNING_BACKEND,
+    SIGNING_BACKENDS,
+    CookieSigner,
+)
+
+
+def local_settings(key_id: str = "LOCALKEYPAIRID") -> SimpleNamespace:
+    """Stand-in for CFSettings with a fresh key pair instead of secretsmanager"""
+    _, private_key = rsa.newkeys(2048)
+    return SimpleNamespace(
+        CFDOMAIN="https://local.cloudfront.net",
+        COOKIE_SIGNING_PRIVATE_KEY=SecretStr(private_key.save_pkcs1().decode()),
+        COOKIE_SIGNING_PUBLIC_KEY_ID=SecretStr(key_id),
+    )
+
+
+def cookies_per_second(
+    sign: Callable,
+    settings: SimpleNamespace,
+    seconds: float,
+    threads: int = 1,
+    resource_paths: Optional[Sequence[str]] = None,
+) -> float:
+    """Call sign(resource_path, settings) from `threads` threads for `seconds`, cycling
+    through `resource_paths`
+    """
+    resource_paths = resource_paths or [f"{settings.CFDOMAIN}/some-sub/*"]
+
+    def worker(offset: int) -> int:
+        count = 0
+        paths = itertools.islice(itertools.cycle(resource_paths), offset, None)
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            sign(next(paths), settings)
+            count += 1
+        return count
+
+    # sign_cookie prints every resource path
+    with contextlib.redirect_stdout(io.StringIO()):
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            return sum(pool.map(worker, range(threads))) / seconds
+
+
+def generate_cases(
+    keys: int, paths_per_key: int, seed: int = 7
+) -> Iterator[Tuple[str, str, datetime.datetime]]:
+    """Key pairs of several sizes with resource paths and expiry dates to sign"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "-_.~%/*?=&äöü€"
+    for k in range(keys):
+        _, private_key = rsa.newkeys(rng.choice([1024, 2048]))
+        private_key_pem = private_key.save_pkcs1().decode()
+        for _ in range(paths_per_key):
+            path = "".join(rng.choices(alphabet, k=rng.randint(0, 120)))
+            resource_path = f"https://d{k}.cloudfront.net/{path}"
+            expires_at = datetime.datetime.fromtimestamp(rng.randint(0, 2**32))
+            yield private_key_pem, resource_path, expires_at
+
+
+def verify_cookie(private_key_pem: str, cookie: Dict) -> None:
+    """Check the signature against the policy like CloudFront does, raises
+    rsa.VerificationError if it does not match
+    """
+
+    def url_b64decode(value: str) -> bytes:
+        # Reverts CloudFrontSigner._url_b64encode
+        value = value.replace("-", "+").replace("_", "=").replace("~", "/")
+        return base64.b64decode(value)
+
+    private_key = rsa.PrivateKey.load_pkcs1(private_key_pem.encode())
+    rsa.verify(
+        url_b64decode(cookie["CloudFront-Policy"]),
+        url_b64decode(cookie["CloudFront-Signature"]),
+        rsa.PublicKey(private_key.n, private_key.e),
+    )
+
+
+def check_parity(keys: int = 4, paths_per_key: int = 25) -> List[Dict]:
+    """Sign every case with all backends, returns the cases they disagree on"""
+    mismatches = []
+    signers: Dict[str, Dict[str, CookieSigner]] = {}
+    for private_key_pem, resource_path, expires_at in generate_cases(keys, paths_per_key):
+        if private_key_pem not in signers:
+            signers[private_key_pem] = {
+                name: CookieSigner(private_key_pem, "KEYPAIRID", name)
+                for name in SIGNING_BACKENDS
+            }
+        cookies = {
+            name: signer.sign(resource_path, expires_at)
+            for name, signer in signers[private_key_pem].items()
+        }
+        if len({tuple(c.items()) for c in cookies.values()}) != 1:
+            mismatches.append({"resource_path": resource_path, "cookies": cookies})
+        # CloudFront has to accept the signature of the default backend
+        verify_cookie(private_key_pem, cookies[DEFAULT_SIGNING_BACKEND])
+    return mismatches
+
+
+if __name__ == "__main__":
+    print("Backends:", ", ".join(SIGNING_BACKENDS))
+    found = check_parity()
+    print("Mismatches:", len(found))
+    # Mismatches: 0
+    if found:
+        raise SystemExit(1)
@@ -0,0 +1,176 @@
+""" Signed cookies are reused for the same resource path. Expiry dates are rounded down to
+buckets, so requests within one bucket ask for the same policy and only the first of
+them pays for the RSA signature. """
+import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+
+from python_examples.sign_cf_cookies.example_005 import (
+    COOKIE_LIFETIME,
+    CookieSigner,
+    get_cookie_signer,
+)
+
+if TYPE_CHECKING:
+    from python_examples.sign_cf_cookies.example_003 import CFSettings
+
+# Cookies are valid for COOKIE_LIFETIME minus at most one bucket
+EXPIRY_BUCKET = datetime.timedelta(minutes=10)
+SIGNED_COOKIES_MAXSIZE = 4096
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def bucket_expiry(
+    now: datetime.datetime,
+    lifetime: datetime.timedelta = COOKIE_LIFETIME,
+    bucket: datetime.timedelta = EXPIRY_BUCKET,
+) -> datetime.datetime:
+    """Round now + lifetime down to the start of its bucket"""
+    return EPOCH + (now + lifetime - EPOCH) // bucket * bucket
+
+
+class SignedCookieCache:
+    """LRU cache of signed cookies by resource path and bucketed expiry. Entries of an
+    older bucket are never asked for again and leave as least recently used.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = SIGNED_COOKIES_MAXSIZE,
+        lifetime: datetime.timedelta = COOKIE_LIFETIME,
+        bucket: datetime.timedelta = EXPIRY_BUCKET,
+    ):
+        if not datetime.timedelta(0) < bucket < lifetime:
+            raise ValueError("The expiry bucket has to be shorter than the lifetime.")
+        self.maxsize = maxsize
+        self.lifetime = lifetime
+        self.bucket = bucket
+        self.entries: "OrderedDict[Tuple[str, datetime.datetime], Dict]" = OrderedDict()
+        self.signer: Optional[CookieSigner] = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def expiry(self, now: datetime.datetime) -> datetime.datetime:
+        return bucket_expiry(now, self.lifetime, self.bucket)
+
+    def lookup(
+        self, signer: CookieSigner, resource_path: str, now: datetime.datetime
+    ) -> Optional[Dict]:
+        key = (resource_path, self.expiry(now))
+        with self.lock:
+            if signer is not self.signer:
+                # Cookies of a rotated key pair are not accepted anymore
+                self.entries.clear()
+                self.signer = signer
+            cookies = self.entries.get(key)
+            if cookies is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(cookies)
+
+    def put(
+        self,
+        signer: CookieSigner,
+        resource_path: str,
+        now: datetime.datetime,
+        cookies: Dict,
+    ) -> None:
+        with self.lock:
+            if signer is self.signer:
+                self.entries[(resource_path, self.expiry(now))] = cookies
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+
+    def get(
+        self, signer: CookieSigner, resource_path: str, now: datetime.datetime
+    ) -> Dict:
+        cookies = self.lookup(signer, resource_path, now)
+        if cookies is None:
+            # Sign outside of the lock, other threads keep reading the cache meanwhile
+            cookies = signer.sign(resource_path, self.expiry(now))
+            self.put(signer, resource_path, now, cookies)
+        return dict(cookies)
+
+    @property
+    def metrics(self) -> Dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+        }
+
+
+signed_cookies = SignedCookieCache()
+
+
+def sign_cookie(resource_path: str, settings: "CFSettings") -> Dict:
+    """example_005.sign_cookie, repeated requests within a bucket cost a lookup"""
+    print("Generating cookie to access resource_path:", resource_path)
+    return signed_cookies.get(
+        get_cookie_signer(settings), resource_path, datetime.datetime.now()
+    )
+
+
+def sign_cookies_batch(
+    resource_paths: Sequence[str],
+    settings: "CFSettings",
+    executor: Optional[Executor] = None,
+) -> Dict[str, Dict]:
+    """Signed cookies per resource path. The signer is looked up once and all cookies
+    share one expiry, with an `executor` the policies are signed in parallel.
+    """
+    print("Generating cookies to access resource_paths:", ", ".join(resource_paths))
+    signer = get_cookie_signer(settings)
+    now = datetime.datetime.now()
+
+    def sign(resource_path: str) -> Dict:
+        return signed_cookies.get(signer, resource_path, now)
+
+    signed = executor.map(sign, resource_paths) if executor else map(sign, resource_paths)
+    return dict(zip(resource_paths, signed))
+
+
+if __name__ == "__main__":
+    from python_examples.sign_cf_cookies import example_005
+    from python_examples.sign_cf_cookies.example_006 import (
+        cookies_per_second,
+        local_settings,
+    )
+
+    settings = local_settings()
+    user_paths = [f"{settings.CFDOMAIN}/user-{u:04d}/*" for u in range(200)]
+    before = cookies_per_second(example_005.sign_cookie, settings, 2.0, 4, user_paths)
+    after = cookies_per_second(sign_cookie, settings, 2.0, 4, user_paths)
+    print(f"example_005.sign_cookie: {before:10.1f} cookies/s")
+    print(f"example_007.sign_cookie: {after:10.1f} cookies/s ({after / before:.0f}x)")
+    print(signed_cookies.metrics)
+
+    # Within a bucket the cookies are the same, the next bucket signs a new policy
+    signer = get_cookie_signer(settings)
+    noon = datetime.datetime(2022, 6, 1, 12, 0)
+    first = signed_cookies.get(signer, user_paths[0], noon)
+    same = signed_cookies.get(signer, user_paths[0], noon + EXPIRY_BUCKET / 2)
+    renewed = signed_cookies.get(signer, user_paths[0], noon + EXPIRY_BUCKET)
+    print("Same bucket, same cookies:", first == same)
+    # Same bucket, same cookies: True
+    print("Next bucket, new cookies:", first != renewed)
+    # Next bucket, new cookies: True
+
+    # One call for the users own path and the paths of its groups
+    batch = sign_cookies_batch(
+        [f"{settings.CFDOMAIN}/user-0000/*", f"{settings.CFDOMAIN}/groups/admins/*"],
+        settings,
+    )
+    print({path: cookies["CloudFront-Key-Pair-Id"] for path, cookies in batch.items()})
+    # {'https://local.cloudfront.net/user-0000/*': 'LOCALKEYPAIRID', ...}
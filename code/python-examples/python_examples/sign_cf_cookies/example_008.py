@@ -0,0 +1,92 @@
+""" The app of example_002 signing with the cached signer of example_007, plus a batch
+endpoint for the users own path and the paths of its groups. Secrets and the JWKS are
+resolved lazily, importing the app makes no calls to secretsmanager or cognito. """
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from fastapi import Depends, FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from python_examples.sign_cf_cookies.example_007 import sign_cookie, sign_cookies_batch
+from python_examples.sign_cf_cookies.example_009 import LazyCFSettings
+from python_examples.sign_cf_cookies.example_013 import CachedCognitoClaims
+
+# Upper bound of resource paths per batch request
+MAX_BATCH_SIZE = 16
+# Fetch the secrets on startup instead of in the first request
+WARM_UP_SETTINGS = os.getenv("WARM_UP_SETTINGS", "true").lower() == "true"
+
+app = FastAPI()
+# Batches with cookies that are not cached yet are signed in parallel
+signing_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+cloudfront_settings = LazyCFSettings()
+
+
+class AccessUser(BaseModel):
+    sub: str
+    groups: List[str] = Field([], alias="cognito:groups")
+
+
+access_user = CachedCognitoClaims(
+    region=os.environ["REGION"],
+    userPoolId=os.environ["USERPOOLID"],
+    client_id=os.environ["APPCLIENTID"],
+    schema=AccessUser,
+)
+
+
+@app.on_event("startup")
+async def warm_up_settings():
+    if not WARM_UP_SETTINGS:
+        return
+    try:
+        await cloudfront_settings.warm_up()
+    except Exception as e:
+        # Not fatal, the first request fetches the secrets again
+        print("An error occured (warming up settings failed):")
+        print(e)
+
+
+def get_resource_path(request_path: str) -> str:
+    # e.g. "https://{distribution}.cloudfront.net/{sub}/*"
+    return "{0}/{1}/*".format(cloudfront_settings.CFDOMAIN, request_path)
+
+
+def authorize_request_paths(request_paths: List[str], current_user: AccessUser) -> None:
+    if len(request_paths) > MAX_BATCH_SIZE:
+        raise HTTPException(400, detail=f"At most {MAX_BATCH_SIZE} request paths")
+    granted = {current_user.sub} | {f"groups/{group}" for group in current_user.groups}
+    if not granted.issuperset(request_paths):
+        raise HTTPException(401, detail="Unauthorized")
+
+
+@app.get("/access/")
+def secure_access(current_user: AccessUser = Depends(access_user)):
+    # access token is valid and getting user info from access token
+    return f"Hello {current_user.sub}"
+
+
+@app.get("/sign_cookies")
+def obtain_cookies(
+    request_path: str, current_user: AccessUser = Depends(access_user)
+) -> Dict:
+    if current_user.sub != request_path:
+        raise HTTPException(401, detail="Unauthorized")
+    return sign_cookie(get_resource_path(current_user.sub), cloudfront_settings)
+
+
+@app.get("/sign_cookies_batch")
+def obtain_cookies_batch(
+    request_paths: List[str] = Query(...),
+    current_user: AccessUser = Depends(access_user),
+) -> Dict[str, Dict]:
+    """Cookies for the users own path ("{sub}") and its groups ("groups/{group}"), the
+    user is verified once for all of them
+    """
+    authorize_request_paths(request_paths, current_user)
+    resource_paths = {path: get_resource_path(path) for path in request_paths}
+    signed = sign_cookies_batch(
+        list(resource_paths.values()), cloudfront_settings, signing_executor
+    )
+    return {path: signed[resource_path] for path, resource_path in resource_paths.items()}
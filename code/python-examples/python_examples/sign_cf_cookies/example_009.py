@@ -0,0 +1,235 @@
+""" A secrets provider shared by all settings of a process: one secretsmanager client,
+secrets are fetched together and kept in memory for a ttl, refreshed in the background
+shortly before they expire """
+import asyncio
+import base64
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import boto3
+from botocore.exceptions import ClientError
+from pydantic import BaseSettings, root_validator
+from pydantic.types import SecretStr
+
+SECRETS_TTL = 300
+# Secrets older than this, but younger than the ttl, are refreshed in the background
+SECRETS_REFRESH_AFTER = 240
+# Max number of secret ids per batch_get_secret_value call
+SECRETS_BATCH_SIZE = 20
+
+COOKIE_SIGNING_SECRETS = (
+    "BP_COOKIE_SIGNER_PRIVATE_KEY",
+    "BP_COOKIE_SIGNER_PUBLIC_KEY_ID",
+)
+
+NEVER = float("-inf")
+
+
+class SecretsProvider:
+    """Secrets by name from one region, cached for `ttl` seconds"""
+
+    def __init__(
+        self,
+        region_name: str,
+        ttl: float = SECRETS_TTL,
+        refresh_after: float = SECRETS_REFRESH_AFTER,
+        client=None,
+    ):
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.client = client or boto3.session.Session().client(
+            service_name="secretsmanager", region_name=region_name
+        )
+        self.values: Dict[str, SecretStr] = {}
+        self.fetched_at: Dict[str, float] = {}
+        self.fetch_lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.batch_supported = True
+
+    @staticmethod
+    def secret_value(response: Dict) -> SecretStr:
+        # Same handling as read_public_key of example_003
+        if "SecretString" in response:
+            return SecretStr(response["SecretString"])
+        return SecretStr(base64.b64decode(response["SecretBinary"]))
+
+    def fetch_batch(self, names: Sequence[str]) -> Dict[str, SecretStr]:
+        values = {}
+        for start in range(0, len(names), SECRETS_BATCH_SIZE):
+            batch = names[start:][:SECRETS_BATCH_SIZE]
+            response = self.client.batch_get_secret_value(SecretIdList=list(batch))
+            for error in response.get("Errors", []):
+                raise ClientError(
+                    {"Error": {"Code": error["ErrorCode"], "Message": error["Message"]}},
+                    "BatchGetSecretValue",
+                )
+            for secret in response["SecretValues"]:
+                values[secret["Name"]] = self.secret_value(secret)
+        return values
+
+    def fetch(self, names: Sequence[str]) -> Dict[str, SecretStr]:
+        """Fetch the secrets with one batch_get_secret_value call. Clients without it
+        (botocore < 1.33, moto < 5) and roles granting only secretsmanager:GetSecretValue
+        fall back to one get_secret_value call per secret
+        """
+        if self.batch_supported:
+            try:
+                return self.fetch_batch(names)
+            except (AttributeError, NotImplementedError):
+                self.batch_supported = False
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "AccessDeniedException":
+                    raise
+                self.batch_supported = False
+        return {
+            name: self.secret_value(self.client.get_secret_value(SecretId=name))
+            for name in names
+        }
+
+    def store(self, values: Dict[str, SecretStr]) -> None:
+        self.values.update(values)
+        self.fetched_at.update(dict.fromkeys(values, time.monotonic()))
+
+    def age(self, name: str) -> float:
+        return time.monotonic() - self.fetched_at.get(name, NEVER)
+
+    def refresh_in_background(self, names: Sequence[str]) -> None:
+        # A single refresh at a time, callers keep getting the cached values meanwhile
+        if not self.refresh_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self.store(self.fetch(names))
+            except Exception as e:
+                # Not fatal, the values are fetched again when they expire
+                print("An error occured (refreshing secrets failed):")
+                print(e)
+            finally:
+                self.refresh_lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def get_many(self, names: Sequence[str]) -> Dict[str, SecretStr]:
+        """Secrets by name, missing and expired ones are fetched in one go"""
+        if any(self.age(name) > self.ttl for name in names):
+            with self.fetch_lock:
+                # Threads waiting for the lock find the secrets fetched by the first one
+                expired = [name for name in names if self.age(name) > self.ttl]
+                if expired:
+                    self.store(self.fetch(expired))
+        stale = [name for name in names if self.age(name) > self.refresh_after]
+        if stale:
+            self.refresh_in_background(stale)
+        return {name: self.values[name] for name in names}
+
+    def get(self, name: str) -> SecretStr:
+        return self.get_many([name])[name]
+
+
+# One provider (and client) per region and process
+secrets_providers: Dict[str, SecretsProvider] = {}
+
+
+def get_secrets_provider(region_name: Optional[str]) -> SecretsProvider:
+    if region_name not in secrets_providers:
+        secrets_providers[region_name] = SecretsProvider(region_name)
+    return secrets_providers[region_name]
+
+
+class CFSettings(BaseSettings):
+    """CFSettings of example_003, both secrets are read with one call of the provider"""
+
+    CFDOMAIN: Optional[str] = os.getenv("CFDOMAIN") or None
+    SECRET_REGION: Optional[str] = os.getenv("SECRET_REGION") or None
+    COOKIE_SIGNING_PRIVATE_KEY: Optional[SecretStr] = None
+    COOKIE_SIGNING_PUBLIC_KEY_ID: Optional[SecretStr] = None
+
+    @root_validator
+    def val_private_key(cls, values: Dict):
+        secrets = get_secrets_provider(values["SECRET_REGION"]).get_many(
+            COOKIE_SIGNING_SECRETS
+        )
+        private_key_secret, public_key_id_secret = secrets.values()
+        return {
+            "CFDOMAIN": values["CFDOMAIN"],
+            "COOKIE_SIGNING_PRIVATE_KEY": private_key_secret,
+            "COOKIE_SIGNING_PUBLIC_KEY_ID": public_key_id_secret,
+        }
+
+
+class LazyCFSettings(BaseSettings):
+    """CFSettings resolving its secrets on access instead of on creation, creating it
+    makes no calls and rotated secrets are picked up once the providers ttl passed
+    """
+
+    CFDOMAIN: Optional[str] = os.getenv("CFDOMAIN") or None
+    SECRET_REGION: Optional[str] = os.getenv("SECRET_REGION") or None
+
+    @property
+    def secrets(self) -> Dict[str, SecretStr]:
+        return get_secrets_provider(self.SECRET_REGION).get_many(COOKIE_SIGNING_SECRETS)
+
+    @property
+    def COOKIE_SIGNING_PRIVATE_KEY(self) -> SecretStr:  # noqa: N802
+        return self.secrets[COOKIE_SIGNING_SECRETS[0]]
+
+    @property
+    def COOKIE_SIGNING_PUBLIC_KEY_ID(self) -> SecretStr:  # noqa: N802
+        return self.secrets[COOKIE_SIGNING_SECRETS[1]]
+
+    async def warm_up(self) -> None:
+        """Resolve the secrets in a worker thread, without blocking the event loop"""
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.secrets)
+
+
+if __name__ == "__main__":
+    from moto import mock_secretsmanager
+
+    def count_calls(provider: SecretsProvider) -> Dict[str, int]:
+        calls: Dict[str, int] = {}
+
+        def count(model, **kwargs):  # noqa: U100
+            calls[model.name] = calls.get(model.name, 0) + 1
+
+        provider.client.meta.events.register("before-call.secretsmanager", count)
+        return calls
+
+    with mock_secretsmanager():
+        region = "eu-central-1"
+        client = boto3.client("secretsmanager", region_name=region)
+        client.create_secret(Name=COOKIE_SIGNING_SECRETS[0], SecretString="private-key")
+        client.create_secret(Name=COOKIE_SIGNING_SECRETS[1], SecretString="K1")
+
+        api_calls = count_calls(get_secrets_provider(region))
+        for _ in range(10):
+            CFSettings(SECRET_REGION=region)
+        print("Calls for 10 settings:", api_calls)
+        # Calls for 10 settings: {'BatchGetSecretValue': 1, 'GetSecretValue': 2}
+        # moto < 5 has no BatchGetSecretValue, the provider falls back to single calls
+
+        # Stale secrets are served while the refresh runs in the background
+        provider = SecretsProvider(region, ttl=1.0, refresh_after=0.2)
+        print(provider.get(COOKIE_SIGNING_SECRETS[1]).get_secret_value())
+        # K1
+        client.put_secret_value(SecretId=COOKIE_SIGNING_SECRETS[1], SecretString="K2")
+        time.sleep(0.3)
+        print(provider.get(COOKIE_SIGNING_SECRETS[1]).get_secret_value())
+        # K1
+        time.sleep(0.1)
+        print(provider.get(COOKIE_SIGNING_SECRETS[1]).get_secret_value())
+        # K2
+
+        # Lazy settings make their calls on first access, not on creation
+        secrets_providers.clear()
+        settings = LazyCFSettings(SECRET_REGION=region)
+        api_calls = count_calls(get_secrets_provider(region))
+        print("Calls after creating:", sum(api_calls.values()))
+        # Calls after creating: 0
+        asyncio.run(settings.warm_up())
+        print("Calls after warm up:", sum(api_calls.values()) > 0)
+        # Calls after warm up: True
+        print(settings.COOKIE_SIGNING_PUBLIC_KEY_ID.get_secret_value())
+        # K2
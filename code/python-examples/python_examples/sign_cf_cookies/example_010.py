@@ -0,0 +1,83 @@
+""" Import time of the settings and the app with a mocked secretsmanager, each api call
+is delayed by a round trip to show what blocks the worker before it accepts traffic """
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict
+
+STATEMENTS = {
+    "example_003 (CFSettings on import)": (
+        "import python_examples.sign_cf_cookies.example_003"
+    ),
+    "example_009 (LazyCFSettings)": (
+        "from python_examples.sign_cf_cookies.example_009 import LazyCFSettings\n"
+        "LazyCFSettings()"
+    ),
+    "example_008 (app)": "import python_examples.sign_cf_cookies.example_008",
+}
+
+# Runs ahead of the measured statement: libraries both variants need are imported, the
+# secrets are created in moto and every api call is counted and delayed
+PRELUDE = """
+import json, os, time
+
+import boto3
+import botocore.client
+from moto import mock_secretsmanager
+
+os.environ.update(
+    REGION="eu-central-1",
+    USERPOOLID="eu-central-1_local",
+    APPCLIENTID="local-client-id",
+    SECRET_REGION="eu-central-1",
+    CFDOMAIN="https://local.cloudfront.net",
+)
+mock_secretsmanager().start()
+client = boto3.client("secretsmanager", region_name="eu-central-1")
+client.create_secret(Name="BP_COOKIE_SIGNER_PRIVATE_KEY", SecretString="private-key")
+client.create_secret(Name="BP_COOKIE_SIGNER_PUBLIC_KEY_ID", SecretString="K1")
+
+api_calls = []
+make_api_call = botocore.client.BaseClient._make_api_call
+
+
+def delayed_api_call(self, operation_name, api_params):
+    api_calls.append(operation_name)
+    time.sleep({latency})
+    return make_api_call(self, operation_name, api_params)
+
+
+botocore.client.BaseClient._make_api_call = delayed_api_call
+started = time.perf_counter()
+"""
+
+REPORT = """
+print(json.dumps({"seconds": time.perf_counter() - started, "api_calls": api_calls}))
+"""
+
+
+def measure(statement: str, latency: float) -> Dict:
+    """Run `statement` in a fresh interpreter, returns its duration and api calls"""
+    completed = subprocess.run(
+        [sys.executable, "-c", PRELUDE.format(latency=latency) + statement + REPORT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--latency-ms", type=float, default=30, help="Delay per secretsmanager call"
+    )
+    args = arg_parser.parse_args()
+
+    for name, statement in STATEMENTS.items():
+        result = measure(statement, args.latency_ms / 1000)
+        print(
+            f"{name:<36} {result['seconds'] * 1000:8.1f}ms "
+            f"{len(result['api_calls'])} secretsmanager calls"
+        )
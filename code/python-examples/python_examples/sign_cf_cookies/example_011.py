@@ -0,0 +1,147 @@
+""" Async variants of the routes of example_008. Signing runs on a bounded executor, a
+thread pool or a process pool (SIGNING_PROCESSES=true) to sign on all cores, so the
+event loop keeps serving other requests. A full signing queue is answered with 503. """
+import asyncio
+import datetime
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from python_examples.sign_cf_cookies.example_005 import (
+    get_cookie_signer,
+    sign_with_key_pair,
+)
+from python_examples.sign_cf_cookies.example_007 import signed_cookies
+from python_examples.sign_cf_cookies.example_008 import (
+    AccessUser,
+    access_user,
+    authorize_request_paths,
+    cloudfront_settings,
+    get_resource_path,
+    warm_up_settings,
+)
+
+SIGNING_PROCESSES = os.getenv("SIGNING_PROCESSES", "false").lower() == "true"
+SIGNING_WORKERS = int(os.getenv("SIGNING_WORKERS") or os.cpu_count())
+# Signing tasks queued or running at once, requests beyond are rejected
+SIGNING_QUEUE_SIZE = int(os.getenv("SIGNING_QUEUE_SIZE") or 4 * SIGNING_WORKERS)
+
+
+class SigningQueueFull(Exception):
+    """Raised when all slots of the BoundedExecutor are taken"""
+
+
+class BoundedExecutor:
+    """Runs functions on `executor` for the event loop, with at most `max_pending` tasks
+    queued or running. Further tasks fail right away instead of waiting in the queue.
+    """
+
+    def __init__(self, executor: Executor, max_pending: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args):
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            raise SigningQueueFull()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is freed when the task is done, even if the request was cancelled
+        future.add_done_callback(lambda _: self.slots.release())
+        return await asyncio.wrap_future(future)
+
+
+# Created on first use and dropped on shutdown, so a restarted app gets a fresh pool
+signing_executor: Optional[BoundedExecutor] = None
+
+
+def get_signing_executor() -> BoundedExecutor:
+    global signing_executor
+    if signing_executor is None:
+        signing_executor = BoundedExecutor(
+            ProcessPoolExecutor(
+                SIGNING_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            if SIGNING_PROCESSES
+            else ThreadPoolExecutor(SIGNING_WORKERS),
+            SIGNING_QUEUE_SIZE,
+        )
+    return signing_executor
+
+
+async def sign_cookies_async(resource_paths: List[str]) -> Dict[str, Dict]:
+    """Signed cookies per resource path, cached ones are served without the executor"""
+    # Expired secrets are fetched from secretsmanager and a new key is parsed, neither
+    # may block the event loop. Only the in memory cache lookup runs on it.
+    signer = await run_in_threadpool(get_cookie_signer, cloudfront_settings)
+    now = datetime.datetime.now()
+    cookies = {path: signed_cookies.lookup(signer, path, now) for path in resource_paths}
+    missing = [path for path, signed in cookies.items() if signed is None]
+    if missing:
+        key_pair = (signer.private_key_pem, signer.public_key_id)
+        signed = await get_signing_executor().run(
+            sign_with_key_pair, key_pair, missing, signed_cookies.expiry(now)
+        )
+        for path, path_cookies in zip(missing, signed):
+            signed_cookies.put(signer, path, now, path_cookies)
+            cookies[path] = path_cookies
+    return cookies
+
+
+app = FastAPI()
+app.add_event_handler("startup", warm_up_settings)
+
+
+@app.on_event("shutdown")
+def shutdown_signing_executor():
+    global signing_executor
+    if signing_executor is not None:
+        # Queued tasks are cancelled, waiting joins the workers and frees their resources
+        signing_executor.executor.shutdown(wait=True, cancel_futures=True)
+        signing_executor = None
+
+
+@app.exception_handler(SigningQueueFull)
+async def signing_queue_full(request: Request, exc: SigningQueueFull):  # noqa: U100
+    return JSONResponse(
+        {"detail": "Too many signing requests"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.get("/access/")
+async def secure_access(current_user: AccessUser = Depends(access_user)):
+    return f"Hello {current_user.sub}"
+
+
+@app.get("/sign_cookies")
+async def obtain_cookies(
+    request_path: str, current_user: AccessUser = Depends(access_user)
+) -> Dict:
+    if current_user.sub != request_path:
+        raise HTTPException(401, detail="Unauthorized")
+    resource_path = get_resource_path(current_user.sub)
+    return (await sign_cookies_async([resource_path]))[resource_path]
+
+
+@app.get("/sign_cookies_batch")
+async def obtain_cookies_batch(
+    request_paths: List[str] = Query(...),
+    current_user: AccessUser = Depends(access_user),
+) -> Dict[str, Dict]:
+    authorize_request_paths(request_paths, current_user)
+    resource_paths = {path: get_resource_path(path) for path in request_paths}
+    signed = await sign_cookies_async(list(set(resource_paths.values())))
+    return {path: signed[resource_path] for path, resource_path in resource_paths.items()}
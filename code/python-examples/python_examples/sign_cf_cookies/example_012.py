@@ -0,0 +1,163 @@
+""" Load test of the sync app (example_008) against the async app (example_011) with
+thread or process pool signing. Each app runs in uvicorn with a mocked secretsmanager,
+the signed cookie cache is disabled so every request signs. A probe measures how long
+/access/ takes meanwhile. """
+import argparse
+import concurrent.futures
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+CONFIGS: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "sync (example_008)": ("python_examples.sign_cf_cookies.example_008", {}),
+    "async threads (example_011)": (
+        "python_examples.sign_cf_cookies.example_011",
+        {"SIGNING_PROCESSES": "false"},
+    ),
+    "async processes (example_011)": (
+        "python_examples.sign_cf_cookies.example_011",
+        {"SIGNING_PROCESSES": "true"},
+    ),
+}
+USER = "load-test-user"
+
+SERVER = """
+import importlib, sys
+
+import boto3, uvicorn
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from moto import mock_secretsmanager
+
+mock_secretsmanager().start()
+private_pem = rsa.generate_private_key(65537, 2048).private_bytes(
+    serialization.Encoding.PEM,
+    serialization.PrivateFormat.TraditionalOpenSSL,
+    serialization.NoEncryption(),
+)
+client = boto3.client("secretsmanager", region_name="eu-central-1")
+client.create_secret(
+    Name="BP_COOKIE_SIGNER_PRIVATE_KEY", SecretString=private_pem.decode()
+)
+client.create_secret(Name="BP_COOKIE_SIGNER_PUBLIC_KEY_ID", SecretString="LOADTEST")
+module = importlib.import_module(sys.argv[1])
+
+from python_examples.sign_cf_cookies import example_007, example_008
+
+module.app.dependency_overrides[example_008.access_user] = lambda: (
+    example_008.AccessUser(sub="{user}")
+)
+example_007.signed_cookies.maxsize = 0
+uvicorn.run(module.app, port=int(sys.argv[2]), log_level="warning")
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(connection: http.client.HTTPConnection, path: str) -> Tuple[int, float]:
+    started = time.perf_counter()
+    connection.request("GET", path)
+    response = connection.getresponse()
+    response.read()
+    return response.status, time.perf_counter() - started
+
+
+def start_server(module: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.replace("{user}", USER), module, str(port)],
+        env={
+            **os.environ,
+            "REGION": "eu-central-1",
+            "USERPOOLID": "eu-central-1_local",
+            "APPCLIENTID": "local-client-id",
+            "SECRET_REGION": "eu-central-1",
+            "CFDOMAIN": "https://local.cloudfront.net",
+            **env,
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            get(http.client.HTTPConnection("127.0.0.1", port, timeout=1), "/access/")
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{module} did not start on port {port}")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def run_load(port: int, concurrency: int, duration: float) -> Dict:
+    deadline = time.perf_counter() + duration
+
+    def client(_) -> List[Tuple[int, float]]:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        results = []
+        while time.perf_counter() < deadline:
+            results.append(get(connection, f"/sign_cookies?request_path={USER}"))
+        return results
+
+    def probe() -> List[float]:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        latencies = []
+        while time.perf_counter() < deadline:
+            latencies.append(get(connection, "/access/")[1])
+            time.sleep(0.05)
+        return latencies
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency + 1) as pool:
+        probe_future = pool.submit(probe)
+        results = [r for rs in pool.map(client, range(concurrency)) for r in rs]
+        probe_latencies = sorted(probe_future.result())
+    signed = sorted(elapsed for status, elapsed in results if status == 200)
+    return {
+        "statuses": dict(Counter(status for status, _ in results)),
+        "signed_per_second": len(signed) / duration,
+        "sign_p50_ms": percentile(signed, 0.5) * 1000,
+        "sign_p99_ms": percentile(signed, 0.99) * 1000,
+        "access_p50_ms": percentile(probe_latencies, 0.5) * 1000,
+        "access_p99_ms": percentile(probe_latencies, 0.99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--concurrency", type=int, default=32)
+    arg_parser.add_argument("--duration", type=float, default=10)
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    arg_parser.add_argument("--queue-size", type=int, help="Default: 4 * workers")
+    arg_parser.add_argument("--only", choices=list(CONFIGS), action="append")
+    args = arg_parser.parse_args()
+
+    for name in args.only or CONFIGS:
+        module, env = CONFIGS[name]
+        env = {**env, "SIGNING_WORKERS": str(args.workers)}
+        if args.queue_size:
+            env["SIGNING_QUEUE_SIZE"] = str(args.queue_size)
+        port = free_port()
+        server = start_server(module, port, env)
+        try:
+            report = run_load(port, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f"{name:<30} {report['signed_per_second']:8.1f} signed/s "
+            f"sign p50 {report['sign_p50_ms']:7.1f}ms p99 {report['sign_p99_ms']:7.1f}ms "
+            f"access p50 {report['access_p50_ms']:7.1f}ms "
+            f"p99 {report['access_p99_ms']:7.1f}ms {report['statuses']}"
+        )
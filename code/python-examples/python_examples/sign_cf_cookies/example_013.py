@@ -0,0 +1,159 @@
+""" Drop-in for Cognito(...).claim(schema) of fastapi_cloudauth as FastAPI dependency.
+Keys come from the process wide JWKS cache of the CloudFront lambda (fetched on first
+use, refreshed after a ttl) and verified users are cached per token until it expires,
+so repeated requests skip the signature check and the pydantic validation. """
+import time
+from typing import Awaitable, Callable, List, Optional, Type
+
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi_cloudauth.messages import (
+    NOT_AUTHENTICATED,
+    NOT_VALIDATED_CLAIMS,
+    NOT_VERIFIED,
+)
+from jose import jwt
+from jose.exceptions import JWSError, JWTError
+from pydantic import BaseModel, ValidationError
+
+from python_examples.oauth_at_cloudfront.example_002 import (
+    CachedTokenVerifier,
+    JWKSCache,
+    TokenVerificationException,
+    VerifiedTokenCache,
+)
+
+VERIFIED_USERS_MAXSIZE = 4096
+
+
+class CachedCognitoClaims:
+    """Verifies cognito access tokens like fastapi_cloudauth's Cognito and returns them
+    as `schema`. The cached instance is returned for repeated tokens, treat it as read
+    only.
+    """
+
+    def __init__(
+        self,
+        region: str,
+        userPoolId: str,  # noqa: N803
+        client_id: str,
+        schema: Type[BaseModel],
+        maxsize: int = VERIFIED_USERS_MAXSIZE,
+        jwks_cache: Optional[JWKSCache] = None,
+    ):
+        self.client_id = client_id
+        self.schema = schema
+        self.verifier = CachedTokenVerifier(userPoolId, client_id, region, jwks_cache)
+        self.users = VerifiedTokenCache(maxsize)
+
+    def verify(self, token: str) -> BaseModel:
+        try:
+            claims = self.verifier.verify_token(token, "access_token", "access")
+        except (TokenVerificationException, JWTError, JWSError):
+            raise HTTPException(401, detail=NOT_VERIFIED) from None
+        if claims.get("client_id") != self.client_id:
+            raise HTTPException(401, detail=NOT_VERIFIED)
+        try:
+            return self.schema.parse_obj(claims)
+        except ValidationError:
+            raise HTTPException(401, detail=NOT_VALIDATED_CLAIMS) from None
+
+    async def __call__(
+        self,
+        http_auth: Optional[HTTPAuthorizationCredentials] = Depends(
+            HTTPBearer(auto_error=False)
+        ),
+    ) -> BaseModel:
+        if http_auth is None:
+            raise HTTPException(401, detail=NOT_AUTHENTICATED)
+        token = http_auth.credentials
+        user = self.users.get(token)
+        if user is not None:
+            return user
+        # A miss might fetch the JWKS, which must not block the event loop
+        user = await run_in_threadpool(self.verify, token)
+        # The signature and 'exp' were checked by verify, reading 'exp' again is safe
+        self.users.put(token, user, jwt.get_unverified_claims(token)["exp"])
+        return user
+
+
+async def users_per_second(
+    dependency: Callable[[HTTPAuthorizationCredentials], Awaitable[BaseModel]],
+    tokens: List[str],
+    users_per_token: int,
+) -> float:
+    """Users per second `dependency` returns, every token is asked for `users_per_token`
+    times
+    """
+    credentials = [
+        HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        for token in tokens
+    ]
+    started = time.perf_counter()
+    for _ in range(users_per_token):
+        for http_auth in credentials:
+            await dependency(http_auth)
+    return users_per_token * len(tokens) / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    import asyncio
+    from unittest import mock
+
+    import requests
+    from fastapi_cloudauth.cognito import Cognito
+
+    from python_examples.oauth_at_cloudfront.example_003 import (
+        CLIENTID,
+        REGION,
+        USERPOOLID,
+        generate_signing_key,
+        issue_token,
+        serve_jwks,
+    )
+
+    class AccessUser(BaseModel):
+        sub: str
+
+    signing_key, public_key = generate_signing_key()
+    stub, url = serve_jwks({"keys": [public_key]})
+    claims_dependency = CachedCognitoClaims(
+        REGION, USERPOOLID, CLIENTID, AccessUser, jwks_cache=JWKSCache(url)
+    )
+
+    def request(token: str) -> str:
+        http_auth = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        try:
+            return asyncio.run(claims_dependency(http_auth)).sub
+        except HTTPException as e:
+            return f"{e.status_code} {e.detail}"
+
+    valid_token = issue_token(signing_key, public_key["kid"], sub="user-1")
+    print(request(valid_token), request(valid_token))
+    # user-1 user-1
+    users = claims_dependency.users
+    print(users.hits, "hits", users.misses, "misses")
+    # 1 hits 1 misses
+    print(request(issue_token(signing_key, public_key["kid"], exp=int(time.time()) - 1)))
+    # 401 Not verified
+    print(request(issue_token(signing_key, public_key["kid"], client_id="other-client")))
+    # 401 Not verified
+
+    # Against the same JWKS stub: Cognito fetches its JWKS once, on construction
+    get = requests.get
+    with mock.patch(
+        "fastapi_cloudauth.verification.requests.get",
+        lambda jwks_url: get(url),  # noqa: U100
+    ):
+        cognito_claims = Cognito(REGION, USERPOOLID, CLIENTID).claim(AccessUser)
+    tokens = [
+        issue_token(signing_key, public_key["kid"], sub=f"user-{t}") for t in range(200)
+    ]
+    for name, dependency in [
+        ("Cognito", cognito_claims),
+        ("CachedCognitoClaims", claims_dependency),
+    ]:
+        rate = asyncio.run(users_per_second(dependency, tokens, users_per_token=20))
+        print(f"{name:<20} {rate:10.0f} users/s")
+    stub.shutdown()
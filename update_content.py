@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
 import os
+import shutil
+import hashlib
 import argparse
 import datetime
+import tempfile
+from typing import List, Optional
 
 name_config = {
     "Let me introduce myself": "Intro",
@@ -10,12 +14,110 @@ name_config = {
     "Work Experience": "Work Experience",
     "Previous Projects": "Projects",
 }
+# Headings match a key when they end with it, so only suffixes of these lengths are
+# looked up
+name_config_key_lengths = sorted({len(key) for key in name_config}, reverse=True)
 
 
 def get_page_meta(key) -> str:
     return f"--- \ntitle: {key} \ndate: {datetime.datetime.utcnow()}\ndraft: false\n---\n\n"
 
 
+def get_page_name(heading: str) -> Optional[str]:
+    for length in name_config_key_lengths:
+        name = name_config.get(heading[-length:])
+        if name is not None:
+            return name
+    return None
+
+
+def get_page_body_hash(page_path: str) -> Optional[str]:
+    """Hash the body of an existing page, everything after its front matter."""
+    if not os.path.exists(page_path):
+        return None
+    with open(page_path, "r") as page:
+        if not page.readline().startswith("---"):
+            return None
+        for line in page:
+            if line.rstrip() == "---":
+                break
+        else:
+            return None
+        page.readline()  # get_page_meta ends with an empty line
+        digest = hashlib.sha256()
+        for line in page:
+            digest.update(line.encode("utf8"))
+    return digest.hexdigest()
+
+
+class PageWriter:
+    """Collects the body of a page in a temporary file next to it, so the front matter
+    and the write itself can be decided once the whole body (and its hash) is known.
+    """
+
+    def __init__(self, name: str, content_dir: str):
+        self.name = name
+        self.page_path = f"{content_dir}/{name.replace(' ', '_')}.md"
+        self.body = tempfile.NamedTemporaryFile(
+            "w+", dir=content_dir, suffix=".md.tmp", delete=False
+        )
+        self.digest = hashlib.sha256()
+
+    def write(self, line: str) -> None:
+        self.body.write(line)
+        self.digest.update(line.encode("utf8"))
+
+    def close(self, skip_unchanged: bool = False) -> bool:
+        """Write the page, returns False if it was skipped because its body didn't
+        change.
+        """
+        try:
+            if (
+                skip_unchanged
+                and get_page_body_hash(self.page_path) == self.digest.hexdigest()
+            ):
+                return False
+            self.body.seek(0)
+            with open(self.page_path, "w") as page_file:
+                page_file.write(get_page_meta(self.name))
+                shutil.copyfileobj(self.body, page_file)
+            return True
+        finally:
+            self.body.close()
+            os.remove(self.body.name)
+
+
+def write_pages(
+    source_markdown: str, content_dir: str = "content/posts", skip_unchanged: bool = False
+) -> List[str]:
+    """Read the source line by line and stream every configured '## ' section into its
+    page, so only a single line of the source is held in memory at any time. With
+    `skip_unchanged` pages with an unchanged body keep their file (and date) untouched.
+    """
+    written = []
+    page: Optional[PageWriter] = None
+    try:
+        with open(source_markdown, "r") as source:
+            for line in source:
+                if line.startswith("## "):
+                    if page is not None and page.close(skip_unchanged):
+                        written.append(page.page_path)
+                    page = None
+                    name = get_page_name(line[3:].rstrip("\n"))
+                    if name is not None:
+                        page = PageWriter(name, content_dir)
+                elif page is not None:
+                    page.write(line)
+        if page is not None and page.close(skip_unchanged):
+            written.append(page.page_path)
+        page = None
+    finally:
+        if page is not None:
+            page.body.close()
+            os.remove(page.body.name)
+    return written
+
+
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument(
@@ -24,21 +126,18 @@ if __name__ == "__main__":
         required=True,
         help="Pass a path to source markdown file to parse information from",
     )
+    arg_parser.add_argument(
+        "--skip_unchanged",
+        action="store_true",
+        help="Only write pages whose content changed, others keep their date",
+    )
     args = arg_parser.parse_args()
 
     if not os.path.exists("content/posts"):
         os.mkdir("content/posts")
     assert os.path.exists(args.source_markdown), "Source not found"
 
-    contents = {}
-    raw = open(args.source_markdown, "r").read()
-
-    for section in raw.split("## "):
-        for key in name_config.keys():
-            if section.split("\n")[0].endswith(key):
-                with open(
-                    f"content/posts/{name_config[key].replace(' ', '_')}.md", "w"
-                ) as content_file:
-                    page_meta = get_page_meta(name_config[key])
-                    page_content = "\n".join(line for line in section.split("\n")[1:])
-                    content_file.write(f"{page_meta}{page_content}")
+    for page_path in write_pages(
+        args.source_markdown, skip_unchanged=args.skip_unchanged
+    ):
+        print(f"Wrote {page_path}")